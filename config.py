@@ -31,6 +31,19 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
 DB_USER = os.getenv("DB_USER", "botuser")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))  # Milliseconds SQLite waits on a locked database
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "5"))  # Seconds between write-behind flushes
+LAST_ACTIVE_FLUSH_INTERVAL = float(os.getenv("LAST_ACTIVE_FLUSH_INTERVAL", "0.25"))  # Seconds to coalesce last_active updates
+LAST_ACTIVE_MIN_INTERVAL = float(os.getenv("LAST_ACTIVE_MIN_INTERVAL", "60"))  # Seconds before a user's last_active is rewritten
+LAST_ACTIVE_CACHE_SIZE = int(os.getenv("LAST_ACTIVE_CACHE_SIZE", "10000"))  # Users whose last touch is remembered for debouncing
+RECENT_USERS_CACHE_SIZE = int(os.getenv("RECENT_USERS_CACHE_SIZE", "10000"))  # Users remembered as registered by /start
+RECENT_USER_TTL = float(os.getenv("RECENT_USER_TTL", "60"))  # Seconds a repeat /start skips the user upsert
+
+# Handler concurrency
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))  # Updates processed at once (one per chat)
+MAX_PARALLEL_HANDLERS = int(os.getenv("MAX_PARALLEL_HANDLERS", "50"))  # Handlers doing DB/Telegram work at once
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))  # Retries for rate-limited API calls
+EDIT_MIN_INTERVAL = float(os.getenv("EDIT_MIN_INTERVAL", "0.25"))  # Seconds between edits of one message
 
 # Lore configuration
 LORE_FILE = os.getenv("LORE_FILE", "data/lore.txt")
@@ -44,4 +57,8 @@ ENABLE_CRAFTING = os.getenv("ENABLE_CRAFTING", "True").lower() == "true"
 
 # Message customization
 DEFAULT_INTERACTION_TIMEOUT = int(os.getenv("DEFAULT_INTERACTION_TIMEOUT", "3600"))  # Default: 1 hour
-MAX_SEARCH_RESULTS = int(os.getenv("MAX_SEARCH_RESULTS", "10"))  # Maximum results to show in search
\ No newline at end of file
+MAX_SEARCH_RESULTS = int(os.getenv("MAX_SEARCH_RESULTS", "10"))  # Maximum results to show in search
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))  # Cached search queries
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))  # Seconds a cached search stays valid
+SETTINGS_CACHE_SIZE = int(os.getenv("SETTINGS_CACHE_SIZE", "10000"))  # Users whose settings are kept in memory
+INVENTORY_CACHE_SIZE = int(os.getenv("INVENTORY_CACHE_SIZE", "10000"))  # Users whose inventory map is kept in memory
\ No newline at end of file
@@ -5,72 +5,379 @@
 Command handlers for lore-related features
 """
 
+import asyncio
 import logging
-import random
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from utils.logger import get_logger
+from utils.cache import LRUCache
+from utils.concurrency import bounded, edit_message, reply_or_edit, send_with_retry
 from utils.fangen_lore_manager import FangenLoreManager
 from utils.database import Database
-from config import BOT_NAME, MAX_SEARCH_RESULTS
+from utils.batching import LastActiveBatcher
+from config import (
+    BOT_NAME, MAX_SEARCH_RESULTS, SEARCH_CACHE_SIZE,
+    DB_FLUSH_INTERVAL, SETTINGS_CACHE_SIZE, MAX_PARALLEL_HANDLERS
+)
 
 logger = get_logger(__name__)
 
+# Prefer orjson for settings (de)serialization when it is installed
+try:
+    import orjson
+    
+    json_loads = orjson.loads
+    
+    def json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    import json
+    
+    json_loads = json.loads
+    json_dumps = json.dumps
+
+# SQL used by the handlers below. Keeping each statement as a single constant
+# means the connection's prepared-statement cache is hit on every call.
+SQL_GET_SETTINGS = "SELECT settings FROM users WHERE user_id = ?"
+SQL_SET_SETTINGS = "UPDATE users SET settings = ? WHERE user_id = ?"
+SQL_INSERT_DISCOVERY = (
+    "INSERT OR IGNORE INTO user_progress (user_id, category, item_name, discovered, discovery_date) "
+    "VALUES (?, ?, ?, TRUE, CURRENT_TIMESTAMP)"
+)
+SQL_RANDOM_UNDISCOVERED = (
+    "SELECT category, item_name FROM lore_entries le "
+    "WHERE NOT EXISTS (SELECT 1 FROM user_progress p WHERE p.user_id = ? "
+    "AND p.category = le.category AND p.item_name = le.item_name AND p.discovered = TRUE) "
+    "ORDER BY RANDOM() LIMIT 1"
+)
+SQL_STATUS_AGG = (
+    "SELECT lt.category, lt.total, COALESCE(up.discovered, 0) AS discovered "
+    "FROM lore_totals lt LEFT JOIN ("
+    "SELECT category, COUNT(*) AS discovered FROM user_progress "
+    "WHERE user_id = ? AND discovered = TRUE GROUP BY category"
+    ") up ON up.category = lt.category "
+    "ORDER BY lt.position"
+)
+SQL_COLLECTION = (
+    "SELECT category, item_name FROM user_progress WHERE user_id = ? AND discovered = TRUE "
+    "ORDER BY category, item_name"
+)
+SQL_COLLECTION_CAT = (
+    "SELECT item_name FROM user_progress "
+    "WHERE user_id = ? AND category = ? AND discovered = TRUE "
+    "ORDER BY item_name"
+)
+
+LORE_MENU_TEXT = (
+    "📚 *Explore the Lore of Fangen* 📚\n\n"
+    "What aspect of this mystical world would you like to discover?"
+)
+SEARCH_HELP_TEXT = (
+    "🔍 *Search the Lore* 🔍\n\n"
+    "To search for lore entries, use the command:\n"
+    "/search [your search term]\n\n"
+    "Example: `/search Diamond`"
+)
+
+# Short callback_data tokens. Telegram caps callback_data at 64 bytes, so
+# arbitrary entry names and search queries are replaced by numeric ids
+ENTRY_TOKEN_PREFIX = "lore_id_"
+SEARCH_MORE_PREFIX = "search_more_"
+
+# Discovery headline per lore category
+_DISCOVERY_INTRO = {
+    "world": "You've uncovered new knowledge about the world!",
+    "events": "A historical event has been revealed to you!",
+    "themes": "You've gained insight into a mystical concept!",
+    "characters": "You've learned about a notable figure!",
+    "locations": "You've discovered a new location!",
+    "factions": "You've learned about a group or faction!",
+    "items": "You've uncovered a legendary item!"
+}
+_DEFAULT_DISCOVERY_INTRO = "You've discovered something new!"
+
+# Dict entry fields shown elsewhere in the message, and the /discover preview length
+_HIDDEN_ENTRY_FIELDS = frozenset(("name", "title", "rarity"))
+_DISCOVER_PREVIEW_CHARS = 200
+
+# Search result buttons shown per category before "See all"
+_RESULTS_PER_CATEGORY = 3
+
+def _format_entry_fields(entry_content: dict, limit: Optional[int] = None) -> str:
+    """Format a dict lore entry as Markdown field paragraphs.
+    
+    Args:
+        entry_content: Entry fields from the lore manager
+        limit: Stop adding fields once the text is longer than this
+        
+    Returns:
+        Formatted text, possibly longer than limit by part of one field
+    """
+    parts = []
+    length = 0
+    for key, value in entry_content.items():
+        if key in _HIDDEN_ENTRY_FIELDS or not value:
+            continue
+        chunk = f"*{key.capitalize()}*: {value}\n\n"
+        parts.append(chunk)
+        length += len(chunk)
+        if limit is not None and length > limit:
+            break
+    return "".join(parts)
+
+# Cyclable setting values and the value each one advances to
+_FREQUENCIES = ('daily', 'weekly', 'monthly', 'never')
+_THEMES = ('default', 'dark', 'light', 'mystic')
+_NEXT_FREQ = {f: _FREQUENCIES[(i + 1) % len(_FREQUENCIES)] for i, f in enumerate(_FREQUENCIES)}
+_NEXT_THEME = {t: _THEMES[(i + 1) % len(_THEMES)] for i, t in enumerate(_THEMES)}
+
+# Settings every user starts with; stored settings are layered on top
+_DEFAULT_SETTINGS = {'notifications': True, 'discovery_frequency': 'daily', 'theme': 'default'}
+
+def _parse_settings(rows: List[Dict]) -> dict:
+    """Build a user's settings from a SQL_GET_SETTINGS result.
+    
+    Args:
+        rows: Query result rows (may be empty)
+        
+    Returns:
+        Settings dictionary with defaults filled in
+    """
+    if not rows or not rows[0]['settings']:
+        return dict(_DEFAULT_SETTINGS)
+    try:
+        stored = json_loads(rows[0]['settings'])
+    except ValueError:
+        logger.warning("Ignoring malformed settings JSON")
+        return dict(_DEFAULT_SETTINGS)
+    if not isinstance(stored, dict):
+        return dict(_DEFAULT_SETTINGS)
+    return {**_DEFAULT_SETTINGS, **stored}
+
+def _pair_rows(buttons: List[InlineKeyboardButton]) -> List[List[InlineKeyboardButton]]:
+    """Lay buttons out two per row, leaving a single button on an odd last row."""
+    return [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+
+# Write-behind buffer, flushed periodically by LoreCommandHandlers._flusher
+_pending_settings: Dict[int, dict] = {}  # user_id -> settings not yet written
+
 class LoreCommandHandlers:
     """Command handlers for lore-related features."""
     
-    def __init__(self, lore_manager: FangenLoreManager, db: Database):
+    def __init__(self, lore_manager: FangenLoreManager, db: Database, last_active_batcher: LastActiveBatcher):
         """Initialize lore command handlers."""
         self.lore_manager = lore_manager
         self.db = db
+        # Shared with the quest handlers so users.last_active has a single writer
+        self.last_active_batcher = last_active_batcher
+        self._flush_task = None
+        # Caps handlers doing DB/Telegram work at the same time
+        self._sem = asyncio.Semaphore(MAX_PARALLEL_HANDLERS)
+        # Lore menu keyboard, valid for one lore version
+        self._lore_menu_markup = None
+        self._lore_menu_version = None
+        # Flat (category, entry_name) list and callback ids into it
+        self._all_entries_list: List[Tuple[str, str]] = []
+        self._entry_ids: Dict[str, int] = {}  # entry_name -> index into _all_entries_list
+        self._entry_version = None
+        self._lore_table_version = None
+        # "See more" search buttons: token -> (category, query)
+        self._search_tokens = LRUCache(maxsize=SEARCH_CACHE_SIZE)
+        self._next_search_token = 0
+        # Write-through per-user settings; the database is only read on a miss
+        self._settings_cache = LRUCache(maxsize=SETTINGS_CACHE_SIZE)
+    
+    def _schedule_flush(self) -> None:
+        """Start the background flusher if it is not already running.
+        
+        The task is started lazily because handlers are constructed before
+        the application's event loop is running.
+        """
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flusher())
+    
+    async def _flusher(self) -> None:
+        """Periodically write buffered settings to the database."""
+        while True:
+            await asyncio.sleep(DB_FLUSH_INTERVAL)
+            try:
+                await self.flush_pending_writes()
+            except Exception as e:
+                logger.error(f"Error flushing pending writes: {e}", exc_info=True)
+    
+    async def flush_pending_writes(self) -> None:
+        """Write all buffered settings.
+        
+        The buffer is written with one executemany, so a burst of updates costs
+        a single commit instead of one per command. Entries are only dropped
+        from the buffer once written, and only if they were not updated again
+        in the meantime.
+        """
+        settings = dict(_pending_settings)
+        if not settings:
+            return
+        
+        written = await self.db.run_async(
+            self.db.execute_many,
+            SQL_SET_SETTINGS,
+            [(json_dumps(user_settings), user_id) for user_id, user_settings in settings.items()]
+        )
+        if not written:
+            return
+        
+        for user_id, user_settings in settings.items():
+            if _pending_settings.get(user_id) is user_settings:
+                del _pending_settings[user_id]
+    
+    async def _load_settings(self, user_id: int) -> dict:
+        """Get a copy of a user's settings, from memory when possible."""
+        settings = _pending_settings.get(user_id) or self._settings_cache.get(user_id)
+        if settings is None:
+            user_settings = await self.db.execute_query_async(SQL_GET_SETTINGS, (user_id,))
+            settings = _parse_settings(user_settings)
+            self._settings_cache.set(user_id, settings)
+        return dict(settings)
+    
+    def _save_settings(self, user_id: int, settings: dict) -> None:
+        """Update cached settings and buffer them to be written by the flusher."""
+        self._settings_cache.set(user_id, settings)
+        _pending_settings[user_id] = settings
+        self._schedule_flush()
     
+    def _get_lore_menu_markup(self) -> InlineKeyboardMarkup:
+        """Get the category keyboard shown by /lore and the lore_back callback.
+        
+        The keyboard only depends on the lore categories, so it is built once
+        per lore_manager.version and shared between requests.
+        """
+        if self._lore_menu_version != self.lore_manager.version:
+            categories = self.lore_manager.get_categories()
+            
+            keyboard = _pair_rows([
+                InlineKeyboardButton(category.capitalize(), callback_data=f"lore_cat_{category}")
+                for category in categories
+            ])
+            
+            # Add search button
+            keyboard.append([InlineKeyboardButton("🔍 Search", callback_data="lore_search")])
+            
+            self._lore_menu_markup = InlineKeyboardMarkup(keyboard)
+            self._lore_menu_version = self.lore_manager.version
+        return self._lore_menu_markup
+    
+    def _ensure_entry_index(self) -> None:
+        """Build the flat entry list and callback ids if the lore has been (re)loaded.
+        
+        Walks lore_data once per lore version so the lore_entries table and
+        entry tokens don't rescan every category on each request.
+        """
+        if self._entry_version == self.lore_manager.version:
+            return
+        
+        entry_ids = {}
+        all_entries = []
+        for category, entries in self.lore_manager.lore_data.items():
+            for entry_name in entries:
+                entry_ids.setdefault(entry_name, len(all_entries))
+                all_entries.append((category, entry_name))
+        
+        self._entry_ids = entry_ids
+        self._all_entries_list = all_entries
+        self._entry_version = self.lore_manager.version
+    
+    def _entry_callback(self, entry_name: str) -> Optional[str]:
+        """Get the callback_data for a button that opens a lore entry.
+        
+        Returns None for names that aren't lore entries, e.g. collection rows
+        recorded from /interact arguments. Their raw names could exceed
+        Telegram's 64-byte callback_data limit, which rejects the whole keyboard.
+        """
+        self._ensure_entry_index()
+        entry_id = self._entry_ids.get(entry_name)
+        if entry_id is None:
+            return None
+        return f"{ENTRY_TOKEN_PREFIX}{self._entry_version}_{entry_id}"
+    
+    def _entry_buttons(self, entry_names: Iterable[str], prefix: str = "") -> List[InlineKeyboardButton]:
+        """Build a button per lore entry, leaving out names that aren't lore entries."""
+        buttons = []
+        for entry_name in entry_names:
+            callback_data = self._entry_callback(entry_name)
+            if callback_data is not None:
+                buttons.append(InlineKeyboardButton(f"{prefix}{entry_name}", callback_data=callback_data))
+        return buttons
+    
+    def _decode_entry_token(self, callback_data: str) -> str:
+        """Expand an entry token back to lore_entry_ form, or lore_back if it is stale.
+        
+        Tokens are "lore_id_<lore version>_<entry id>". A token minted before
+        the lore was reloaded, or one that doesn't parse, resolves to lore_back
+        instead of whatever entry now sits at that index.
+        """
+        self._ensure_entry_index()
+        version, _, entry_id = callback_data[len(ENTRY_TOKEN_PREFIX):].partition("_")
+        if not (version.isdecimal() and entry_id.isdecimal()):
+            return "lore_back"
+        if int(version) != self._entry_version or int(entry_id) >= len(self._all_entries_list):
+            return "lore_back"
+        _, entry_name = self._all_entries_list[int(entry_id)]
+        return f"lore_entry_{entry_name}"
+    
+    def _search_more_callback(self, category: str, query: str) -> str:
+        """Register a "see more" search and get the callback_data for its button."""
+        token = self._next_search_token
+        self._next_search_token += 1
+        self._search_tokens.set(token, (category, query))
+        return f"{SEARCH_MORE_PREFIX}{token}"
+    
+    async def _ensure_lore_table(self) -> None:
+        """Mirror the lore entry list into the database's lore_entries table."""
+        if self._lore_table_version == self.lore_manager.version:
+            return
+        
+        self._ensure_entry_index()
+        if await self.db.run_async(self.db.load_lore_entries, self._all_entries_list):
+            self._lore_table_version = self.lore_manager.version
+    
+    def _discover_random_entry(self, user_id: int) -> Optional[List[Dict]]:
+        """Pick and record a random undiscovered entry in one transaction (worker thread)."""
+        with self.db.transaction():
+            undiscovered = self.db.execute_query(SQL_RANDOM_UNDISCOVERED, (user_id,))
+            if undiscovered:
+                self.db.execute_query(
+                    SQL_INSERT_DISCOVERY,
+                    (user_id, undiscovered[0]['category'], undiscovered[0]['item_name'])
+                )
+        return undiscovered
+    
+    @bounded
     async def lore_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle the /lore command to browse lore by category."""
         user_id = update.effective_user.id
         
         # Log user action
-        self.db.execute_query(
-            "UPDATE users SET last_active = CURRENT_TIMESTAMP WHERE user_id = ?",
-            (user_id,)
-        )
+        self.last_active_batcher.touch(user_id)
         
-        # Get available categories
-        categories = self.lore_manager.get_categories()
-        
-        # Create keyboard with categories
-        keyboard = []
-        for i in range(0, len(categories), 2):
-            row = []
-            row.append(InlineKeyboardButton(
-                categories[i].capitalize(), 
-                callback_data=f"lore_cat_{categories[i]}"
-            ))
-            if i + 1 < len(categories):
-                row.append(InlineKeyboardButton(
-                    categories[i+1].capitalize(), 
-                    callback_data=f"lore_cat_{categories[i+1]}"
-                ))
-            keyboard.append(row)
-        
-        # Add search button
-        keyboard.append([InlineKeyboardButton("🔍 Search", callback_data="lore_search")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            "📚 *Explore the Lore of Fangen* 📚\n\n"
-            "What aspect of this mystical world would you like to discover?",
-            reply_markup=reply_markup,
+        await reply_or_edit(
+            update,
+            LORE_MENU_TEXT,
+            reply_markup=self._get_lore_menu_markup(),
             parse_mode='Markdown'
         )
     
+    @bounded
     async def search_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle the /search command to find specific lore entries."""
         user_id = update.effective_user.id
         query = ' '.join(context.args) if context.args else None
         
         if not query:
-            await update.message.reply_text(
+            await send_with_retry(
+                update.message.reply_text,
                 "Please provide a search term after the command.\n"
                 "Example: `/search Diamond`",
                 parse_mode='Markdown'
@@ -81,7 +388,8 @@ class LoreCommandHandlers:
         results = self.lore_manager.search_lore(query)
         
         if not results:
-            await update.message.reply_text(
+            await send_with_retry(
+                update.message.reply_text,
                 f"No lore entries found for '{query}'.\n\n"
                 f"Try a different search term or browse categories with /lore"
             )
@@ -91,7 +399,7 @@ class LoreCommandHandlers:
         keyboard = []
         total_results = 0
         result_count = 0
-        max_results = MAX_SEARCH_RESULTS if hasattr(context, 'MAX_SEARCH_RESULTS') else 10
+        max_results = MAX_SEARCH_RESULTS
         
         for category, entries in results.items():
             if entries:
@@ -101,21 +409,18 @@ class LoreCommandHandlers:
                     callback_data=f"search_cat_{category}"
                 )])
                 
-                # Add up to 3 results per category
-                for i, entry in enumerate(entries[:3]):
-                    keyboard.append([InlineKeyboardButton(
-                        entry,
-                        callback_data=f"lore_entry_{entry}"
-                    )])
+                # Add up to _RESULTS_PER_CATEGORY results per category
+                for button in self._entry_buttons(entries[:_RESULTS_PER_CATEGORY]):
+                    keyboard.append([button])
                     result_count += 1
                     if result_count >= max_results:
                         break
                 
                 # Add "See more" if there are more results
-                if len(entries) > 3:
+                if len(entries) > _RESULTS_PER_CATEGORY:
                     keyboard.append([InlineKeyboardButton(
                         f"See all {len(entries)} results in {category}...",
-                        callback_data=f"search_more_{category}_{query}"
+                        callback_data=self._search_more_callback(category, query)
                     )])
                 
                 total_results += len(entries)
@@ -128,7 +433,8 @@ class LoreCommandHandlers:
         keyboard.append([InlineKeyboardButton("« Back to Lore", callback_data="lore_back")])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(
+        await send_with_retry(
+            update.message.reply_text,
             f"🔍 *Search Results for '{query}'* 🔍\n\n"
             f"Found {total_results} entries across {len(results)} categories."
             f"{' Showing top results.' if total_results > max_results else ''}",
@@ -136,75 +442,43 @@ class LoreCommandHandlers:
             parse_mode='Markdown'
         )
     
+    @bounded
     async def discover_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle the /discover command to find something new in the world."""
         user_id = update.effective_user.id
         
-        # Get discovered entries
-        discovered = self.db.execute_query(
-            "SELECT category, item_name FROM user_progress WHERE user_id = ? AND discovered = TRUE",
-            (user_id,)
-        )
-        
-        discovered_set = set()
-        if discovered:
-            for item in discovered:
-                discovered_set.add(f"{item['category']}:{item['item_name']}")
-        
-        # Get all entries from all categories
-        all_entries = []
-        for category, entries in self.lore_manager.lore_data.items():
-            for entry_name in entries.keys():
-                entry_key = f"{category}:{entry_name}"
-                if entry_key not in discovered_set:
-                    all_entries.append((category, entry_name))
-        
-        if not all_entries:
-            await update.message.reply_text(
+        # Pick a random entry the user hasn't discovered yet and mark it discovered
+        await self._ensure_lore_table()
+        try:
+            undiscovered = await self.db.run_async(self._discover_random_entry, user_id)
+        except Exception as e:
+            logger.error(f"Error discovering entry for user {user_id}: {e}", exc_info=True)
+            undiscovered = None
+        
+        if not undiscovered:
+            await reply_or_edit(
+                update,
                 "You've discovered all there is to know about the world of Fangen... for now. "
                 "New mysteries await in future updates!"
             )
             return
         
-        # Select a random undiscovered entry
-        random_entry = random.choice(all_entries)
-        category, entry_name = random_entry
-        
-        # Mark as discovered
-        self.db.execute_query(
-            "INSERT OR IGNORE INTO user_progress (user_id, category, item_name, discovered, discovery_date) "
-            "VALUES (?, ?, ?, TRUE, CURRENT_TIMESTAMP)",
-            (user_id, category, entry_name)
-        )
+        category = undiscovered[0]['category']
+        entry_name = undiscovered[0]['item_name']
         
         # Get entry content
         entry_content = self.lore_manager.get_entry_content(entry_name)
         
         if isinstance(entry_content, dict):
-            # Format dict content
-            formatted_content = ""
-            for key, value in entry_content.items():
-                if key not in ["name", "title", "rarity"] and value:
-                    formatted_content += f"*{key.capitalize()}*: {value}\n\n"
-            entry_content = formatted_content
+            # Only format as many fields as the preview can show
+            entry_content = _format_entry_fields(entry_content, _DISCOVER_PREVIEW_CHARS)
         
         # Create discovery message based on category
-        discovery_intro = {
-            "world": "You've uncovered new knowledge about the world!",
-            "events": "A historical event has been revealed to you!",
-            "themes": "You've gained insight into a mystical concept!",
-            "characters": "You've learned about a notable figure!",
-            "locations": "You've discovered a new location!",
-            "factions": "You've learned about a group or faction!",
-            "items": "You've uncovered a legendary item!"
-        }.get(category, "You've discovered something new!")
+        discovery_intro = _DISCOVERY_INTRO.get(category, _DEFAULT_DISCOVERY_INTRO)
         
-        # Create keyboard
-        keyboard = [
-            [InlineKeyboardButton(
-                f"Learn more about {entry_name}",
-                callback_data=f"lore_entry_{entry_name}"
-            )],
+        # Create keyboard; "Learn more" is left out if the entry is no longer in the lore
+        keyboard = [[button] for button in self._entry_buttons([entry_name], prefix="Learn more about ")]
+        keyboard += [
             [InlineKeyboardButton(
                 "Discover more",
                 callback_data="discover_more"
@@ -217,12 +491,13 @@ class LoreCommandHandlers:
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         # Truncate content if too long
-        if entry_content and len(entry_content) > 200:
-            display_content = f"{entry_content[:200]}..."
+        if entry_content and len(entry_content) > _DISCOVER_PREVIEW_CHARS:
+            display_content = f"{entry_content[:_DISCOVER_PREVIEW_CHARS]}..."
         else:
             display_content = entry_content if entry_content else "No detailed information available yet."
         
-        await update.message.reply_text(
+        await reply_or_edit(
+            update,
             f"✨ *{discovery_intro}* ✨\n\n"
             f"*{entry_name}*\n\n"
             f"{display_content}",
@@ -230,34 +505,26 @@ class LoreCommandHandlers:
             parse_mode='Markdown'
         )
     
+    @bounded
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle the /status command to show user progress."""
         user_id = update.effective_user.id
         
-        # Get user stats
-        user_stats = self.db.execute_query(
-            "SELECT COUNT(*) as total, category FROM user_progress "
-            "WHERE user_id = ? AND discovered = TRUE GROUP BY category",
-            (user_id,)
-        )
-        
-        # Get total entries in each category
-        total_entries = {}
-        for category in self.lore_manager.lore_data:
-            total_entries[category] = len(self.lore_manager.lore_data[category])
+        # Get discovered and total entry counts per category in one query
+        await self._ensure_lore_table()
+        user_stats = await self.db.execute_query_async(SQL_STATUS_AGG, (user_id,))
         
         # Format progress message
         progress_lines = []
         total_discovered = 0
         total_available = 0
         
-        for category, count in total_entries.items():
-            if count > 0:
-                discovered = next((item['total'] for item in user_stats if item['category'] == category), 0)
-                total_discovered += discovered
-                total_available += count
-                percentage = (discovered / count * 100) if count > 0 else 0
-                progress_lines.append(f"{category.capitalize()}: {discovered}/{count} ({percentage:.1f}%)")
+        for row in user_stats or []:
+            category, count, discovered = row['category'], row['total'], row['discovered']
+            total_discovered += discovered
+            total_available += count
+            percentage = (discovered / count * 100) if count > 0 else 0
+            progress_lines.append(f"{category.capitalize()}: {discovered}/{count} ({percentage:.1f}%)")
         
         overall_percentage = (total_discovered / total_available * 100) if total_available > 0 else 0
         
@@ -274,7 +541,8 @@ class LoreCommandHandlers:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(
+        await reply_or_edit(
+            update,
             f"📊 *Your Exploration Progress* 📊\n\n"
             f"Overall: {total_discovered}/{total_available} ({overall_percentage:.1f}%)\n\n"
             + "\n".join(progress_lines),
@@ -282,75 +550,48 @@ class LoreCommandHandlers:
             parse_mode='Markdown'
         )
     
+    @bounded
     async def collection_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle the /collection command to view discovered lore entries."""
         user_id = update.effective_user.id
         
         # Get discovered entries
-        discovered = self.db.execute_query(
-            "SELECT category, item_name FROM user_progress WHERE user_id = ? AND discovered = TRUE "
-            "ORDER BY category, item_name",
-            (user_id,)
-        )
+        discovered = await self.db.execute_query_async(SQL_COLLECTION, (user_id,))
         
         if not discovered:
-            await update.message.reply_text(
+            await reply_or_edit(
+                update,
                 "Your collection is empty. Use /discover to find lore entries!"
             )
             return
         
-        # Organize by category
-        collection = {}
-        for item in discovered:
-            category = item['category']
-            if category not in collection:
-                collection[category] = []
-            collection[category].append(item['item_name'])
+        # Count entries per category (rows arrive grouped by category)
+        collection = Counter(item['category'] for item in discovered)
         
         # Create keyboard
-        keyboard = []
-        for category, items in collection.items():
-            keyboard.append([InlineKeyboardButton(
-                f"{category.capitalize()} ({len(items)})",
-                callback_data=f"collection_cat_{category}"
-            )])
+        keyboard = [
+            [InlineKeyboardButton(f"{category.capitalize()} ({count})", callback_data=f"collection_cat_{category}")]
+            for category, count in collection.items()
+        ]
         
         keyboard.append([InlineKeyboardButton("« Back to Status", callback_data="status_back")])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(
+        await reply_or_edit(
+            update,
             f"📚 *Your Lore Collection* 📚\n\n"
             f"You've discovered {len(discovered)} entries across {len(collection)} categories.",
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
     
+    @bounded
     async def settings_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle the /settings command."""
         user_id = update.effective_user.id
         
         # Get current settings
-        user_settings = self.db.execute_query(
-            "SELECT settings FROM users WHERE user_id = ?",
-            (user_id,)
-        )
-        
-        # Parse settings JSON or use default
-        settings = {}
-        if user_settings and user_settings[0]['settings']:
-            try:
-                import json
-                settings = json.loads(user_settings[0]['settings'])
-            except:
-                settings = {}
-        
-        # Default settings
-        if 'notifications' not in settings:
-            settings['notifications'] = True
-        if 'discovery_frequency' not in settings:
-            settings['discovery_frequency'] = 'daily'
-        if 'theme' not in settings:
-            settings['theme'] = 'default'
+        settings = await self._load_settings(user_id)
         
         # Create keyboard
         keyboard = [
@@ -369,47 +610,44 @@ class LoreCommandHandlers:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(
+        await reply_or_edit(
+            update,
             "⚙️ *Bot Settings* ⚙️\n\n"
             "Customize your experience in the world of Fangen:",
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
     
+    @bounded
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle callback queries for lore-related features."""
+        """Handle callback queries for lore-related features.
+        
+        The query has already been answered by main.handle_callback.
+        """
         query = update.callback_query
-        await query.answer()
         
         callback_data = query.data
         user_id = update.effective_user.id
         
-        logger.debug(f"Callback data: {callback_data}")
+        # Expand short entry tokens before routing
+        if callback_data.startswith(ENTRY_TOKEN_PREFIX):
+            callback_data = self._decode_entry_token(callback_data)
+        
+        logger.debug("Callback data: %s", callback_data)
         
         # Category browsing
         if callback_data.startswith("lore_cat_"):
-            category = callback_data.replace("lore_cat_", "")
+            category = callback_data.removeprefix("lore_cat_")
             entries = self.lore_manager.get_entries_by_category(category)
             
-            keyboard = []
             # Add entries in groups of 2
-            for i in range(0, len(entries), 2):
-                row = []
-                row.append(InlineKeyboardButton(
-                    entries[i],
-                    callback_data=f"lore_entry_{entries[i]}"
-                ))
-                if i + 1 < len(entries):
-                    row.append(InlineKeyboardButton(
-                        entries[i+1],
-                        callback_data=f"lore_entry_{entries[i+1]}"
-                    ))
-                keyboard.append(row)
+            keyboard = _pair_rows(self._entry_buttons(entries))
             
             keyboard.append([InlineKeyboardButton("« Back", callback_data="lore_back")])
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 f"📖 *{category.capitalize()} Lore Entries* 📖\n\n"
                 f"Select an entry to learn more:",
                 reply_markup=reply_markup,
@@ -418,63 +656,34 @@ class LoreCommandHandlers:
         
         # View lore entry
         elif callback_data.startswith("lore_entry_"):
-            entry_name = callback_data.replace("lore_entry_", "")
-            entry_content = self.lore_manager.get_entry_content(entry_name)
+            entry_name = callback_data.removeprefix("lore_entry_")
+            category, entry_content, related_chars = self.lore_manager.get_entry_bundle(entry_name)
             
             if not entry_content:
-                await query.edit_message_text(
+                await edit_message(
+                    query,
                     f"The information about {entry_name} seems to be missing from the archives."
                 )
                 return
             
             # Mark entry as discovered
-            category = None
-            for cat, entries in self.lore_manager.lore_data.items():
-                if entry_name in entries:
-                    category = cat
-                    break
-            
             if category:
-                self.db.execute_query(
-                    "INSERT OR IGNORE INTO user_progress (user_id, category, item_name, discovered, discovery_date) "
-                    "VALUES (?, ?, ?, TRUE, CURRENT_TIMESTAMP)",
-                    (user_id, category, entry_name)
-                )
+                await self.db.execute_query_async(SQL_INSERT_DISCOVERY, (user_id, category, entry_name))
             
             # Format content based on type
             if isinstance(entry_content, dict):
-                # Format dict content
-                formatted_content = ""
-                for key, value in entry_content.items():
-                    if key not in ["name", "title", "rarity"] and value:
-                        formatted_content += f"*{key.capitalize()}*: {value}\n\n"
-                content = formatted_content
+                content = _format_entry_fields(entry_content)
             else:
                 content = entry_content
             
-            # Get related entries
-            related_chars = self.lore_manager.get_related_characters(entry_name) if hasattr(self.lore_manager, 'get_related_characters') else []
-            
             # Create keyboard with related entries and back button
-            keyboard = []
-            if related_chars:
-                for i in range(0, len(related_chars), 2):
-                    row = []
-                    row.append(InlineKeyboardButton(
-                        f"👤 {related_chars[i]}",
-                        callback_data=f"lore_entry_{related_chars[i]}"
-                    ))
-                    if i + 1 < len(related_chars):
-                        row.append(InlineKeyboardButton(
-                            f"👤 {related_chars[i+1]}",
-                            callback_data=f"lore_entry_{related_chars[i+1]}"
-                        ))
-                    keyboard.append(row)
+            keyboard = _pair_rows(self._entry_buttons(related_chars, prefix="👤 "))
             
             keyboard.append([InlineKeyboardButton("« Back", callback_data="lore_back")])
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 f"*{entry_name}*\n\n{content}",
                 reply_markup=reply_markup,
                 parse_mode='Markdown'
@@ -482,73 +691,39 @@ class LoreCommandHandlers:
         
         # Handle search
         elif callback_data == "lore_search":
-            await query.edit_message_text(
-                "🔍 *Search the Lore* 🔍\n\n"
-                "To search for lore entries, use the command:\n"
-                "/search [your search term]\n\n"
-                "Example: `/search Diamond`",
-                parse_mode='Markdown'
-            )
+            await edit_message(query, SEARCH_HELP_TEXT, parse_mode='Markdown')
         
         # Back to lore menu
         elif callback_data == "lore_back":
-            # Re-create lore menu
-            categories = self.lore_manager.get_categories()
-            
-            keyboard = []
-            for i in range(0, len(categories), 2):
-                row = []
-                row.append(InlineKeyboardButton(
-                    categories[i].capitalize(), 
-                    callback_data=f"lore_cat_{categories[i]}"
-                ))
-                if i + 1 < len(categories):
-                    row.append(InlineKeyboardButton(
-                        categories[i+1].capitalize(), 
-                        callback_data=f"lore_cat_{categories[i+1]}"
-                    ))
-                keyboard.append(row)
-            
-            keyboard.append([InlineKeyboardButton("🔍 Search", callback_data="lore_search")])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                "📚 *Explore the Lore of Fangen* 📚\n\n"
-                "What aspect of this mystical world would you like to discover?",
-                reply_markup=reply_markup,
+            await edit_message(
+                query,
+                LORE_MENU_TEXT,
+                reply_markup=self._get_lore_menu_markup(),
                 parse_mode='Markdown'
             )
         
         # View collection category
         elif callback_data.startswith("collection_cat_"):
-            category = callback_data.replace("collection_cat_", "")
+            category = callback_data.removeprefix("collection_cat_")
             
             # Get discovered entries in this category
-            discovered = self.db.execute_query(
-                "SELECT item_name FROM user_progress "
-                "WHERE user_id = ? AND category = ? AND discovered = TRUE "
-                "ORDER BY item_name",
-                (user_id, category)
-            )
+            discovered = await self.db.execute_query_async(SQL_COLLECTION_CAT, (user_id, category))
             
             if not discovered:
-                await query.edit_message_text(
+                await edit_message(
+                    query,
                     f"You haven't discovered any {category} entries yet."
                 )
                 return
             
-            # Create keyboard with entries
-            keyboard = []
-            for item in discovered:
-                keyboard.append([InlineKeyboardButton(
-                    item['item_name'],
-                    callback_data=f"lore_entry_{item['item_name']}"
-                )])
+            # Create keyboard with entries; names that aren't lore entries get no button
+            keyboard = [[button] for button in self._entry_buttons(item['item_name'] for item in discovered)]
             
             keyboard.append([InlineKeyboardButton("« Back to Collection", callback_data="view_collection")])
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 f"📚 *Your {category.capitalize()} Collection* 📚\n\n"
                 f"You've discovered {len(discovered)} entries in this category:",
                 reply_markup=reply_markup,
@@ -570,31 +745,13 @@ class LoreCommandHandlers:
         # Toggle notifications
         elif callback_data == "toggle_notifications":
             # Get current settings
-            user_settings = self.db.execute_query(
-                "SELECT settings FROM users WHERE user_id = ?",
-                (user_id,)
-            )
-            
-            # Parse settings JSON or use default
-            settings = {}
-            if user_settings and user_settings[0]['settings']:
-                try:
-                    import json
-                    settings = json.loads(user_settings[0]['settings'])
-                except:
-                    settings = {}
+            settings = await self._load_settings(user_id)
             
             # Toggle notifications
-            if 'notifications' not in settings:
-                settings['notifications'] = True
             settings['notifications'] = not settings['notifications']
             
             # Save settings
-            import json
-            self.db.execute_query(
-                "UPDATE users SET settings = ? WHERE user_id = ?",
-                (json.dumps(settings), user_id)
-            )
+            self._save_settings(user_id, settings)
             
             # Recreate settings menu
             await self.settings_command(update, context)
@@ -602,62 +759,32 @@ class LoreCommandHandlers:
         # Other settings callbacks
         elif callback_data in ["cycle_discovery_frequency", "cycle_theme"]:
             # Get current settings
-            user_settings = self.db.execute_query(
-                "SELECT settings FROM users WHERE user_id = ?",
-                (user_id,)
-            )
-            
-            # Parse settings JSON or use default
-            settings = {}
-            if user_settings and user_settings[0]['settings']:
-                try:
-                    import json
-                    settings = json.loads(user_settings[0]['settings'])
-                except:
-                    settings = {}
-            
-            # Default settings
-            if 'discovery_frequency' not in settings:
-                settings['discovery_frequency'] = 'daily'
-            if 'theme' not in settings:
-                settings['theme'] = 'default'
+            settings = await self._load_settings(user_id)
             
             # Cycle settings
             if callback_data == "cycle_discovery_frequency":
-                frequencies = ['daily', 'weekly', 'monthly', 'never']
-                current_index = frequencies.index(settings['discovery_frequency'])
-                settings['discovery_frequency'] = frequencies[(current_index + 1) % len(frequencies)]
+                settings['discovery_frequency'] = _NEXT_FREQ.get(settings['discovery_frequency'], _FREQUENCIES[0])
             elif callback_data == "cycle_theme":
-                themes = ['default', 'dark', 'light', 'mystic']
-                current_index = themes.index(settings['theme'])
-                settings['theme'] = themes[(current_index + 1) % len(themes)]
+                settings['theme'] = _NEXT_THEME.get(settings['theme'], _THEMES[0])
             
             # Save settings
-            import json
-            self.db.execute_query(
-                "UPDATE users SET settings = ? WHERE user_id = ?",
-                (json.dumps(settings), user_id)
-            )
+            self._save_settings(user_id, settings)
             
             # Recreate settings menu
             await self.settings_command(update, context)
         
         # Search category
         elif callback_data.startswith("search_cat_"):
-            category = callback_data.replace("search_cat_", "")
+            category = callback_data.removeprefix("search_cat_")
             entries = self.lore_manager.get_entries_by_category(category)
             
-            keyboard = []
-            for entry in entries:
-                keyboard.append([InlineKeyboardButton(
-                    entry,
-                    callback_data=f"lore_entry_{entry}"
-                )])
+            keyboard = [[button] for button in self._entry_buttons(entries)]
             
             keyboard.append([InlineKeyboardButton("« Back to Search", callback_data="search_back")])
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 f"🔍 *Search Results in {category.capitalize()}* 🔍\n\n"
                 f"Found {len(entries)} entries:",
                 reply_markup=reply_markup,
@@ -665,29 +792,32 @@ class LoreCommandHandlers:
             )
         
         # See more search results
-        elif callback_data.startswith("search_more_"):
-            parts = callback_data.replace("search_more_", "").split("_")
-            category = parts[0]
-            query_text = parts[1] if len(parts) > 1 else ""
+        elif callback_data.startswith(SEARCH_MORE_PREFIX):
+            try:
+                search = self._search_tokens.get(int(callback_data[len(SEARCH_MORE_PREFIX):]))
+            except ValueError:
+                search = None
+            if search is None:
+                # Button outlived its search; ask for a new one
+                await edit_message(query, SEARCH_HELP_TEXT, parse_mode='Markdown')
+                return
+            category, query_text = search
             
             # Get all entries in this category
             entries = self.lore_manager.get_entries_by_category(category)
             
             # Filter by query if provided
             if query_text:
-                entries = [e for e in entries if query_text.lower() in e.lower()]
+                needle = query_text.lower()
+                entries = [e for e in entries if needle in e.lower()]
             
-            keyboard = []
-            for entry in entries:
-                keyboard.append([InlineKeyboardButton(
-                    entry,
-                    callback_data=f"lore_entry_{entry}"
-                )])
+            keyboard = [[button] for button in self._entry_buttons(entries)]
             
             keyboard.append([InlineKeyboardButton("« Back to Search", callback_data="search_back")])
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            await query.edit_message_text(
+            await edit_message(
+                query,
                 f"🔍 *All {category.capitalize()} Results* 🔍\n\n"
                 f"Found {len(entries)} entries:",
                 reply_markup=reply_markup,
@@ -696,10 +826,4 @@ class LoreCommandHandlers:
         
         # Back to search
         elif callback_data == "search_back":
-            await query.edit_message_text(
-                "🔍 *Search the Lore* 🔍\n\n"
-                "To search for lore entries, use the command:\n"
-                "/search [your search term]\n\n"
-                "Example: `/search Diamond`",
-                parse_mode='Markdown'
-            )
\ No newline at end of file
+            await edit_message(query, SEARCH_HELP_TEXT, parse_mode='Markdown')
\ No newline at end of file
@@ -5,43 +5,265 @@
 Command handlers for ChuzoBot's Quest System
 """
 
+import html
 import logging
 import json
+from collections.abc import Mapping
+from functools import lru_cache, partial
+from itertools import groupby, zip_longest
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
 from utils.logger import get_logger
 from utils.fangen_lore_manager import FangenLoreManager
 from utils.database import Database
 from utils.quest_manager import QuestManager
-from config import BOT_NAME
+from utils.batching import LastActiveBatcher
+from utils.concurrency import edit_message, reply_or_edit
 
 logger = get_logger(__name__)
 
+# Record an interaction, creating the relationship row on first contact.
+# (user_id, character_name) is the table's primary key.
+SQL_TOUCH_RELATIONSHIP = (
+    "INSERT INTO character_relationships (user_id, character_name, relationship_level, last_interaction) "
+    "VALUES (?, ?, 0, CURRENT_TIMESTAMP) "
+    "ON CONFLICT (user_id, character_name) DO UPDATE SET last_interaction = CURRENT_TIMESTAMP"
+)
+
+class CB:
+    """Compact callback_data opcodes. Buttons that carry an argument use
+    f"{op}|{arg}", leaving most of Telegram's 64-byte limit for the argument.
+    """
+    QUEST_VIEW = "qv"
+    QUEST_START = "qs"
+    QUEST_CHOICE = "qc"
+    INTERACT = "ia"
+    END_INTERACTION = "ie"
+    CRAFT_CHECK = "ck"
+    CRAFT_CONFIRM = "cc"
+    ITEM_VIEW = "iv"
+    SEP = "|"
+
+# Opcodes main.handle_callback routes to QuestCommandHandlers
+QUEST_CALLBACK_OPS = frozenset((
+    CB.QUEST_VIEW, CB.QUEST_START, CB.QUEST_CHOICE, CB.INTERACT,
+    CB.END_INTERACTION, CB.CRAFT_CHECK, CB.CRAFT_CONFIRM, CB.ITEM_VIEW
+))
+
+# Prefixes used before opcodes, still accepted for buttons in older messages
+_LEGACY_PREFIXES = {
+    "quest_view_": CB.QUEST_VIEW,
+    "quest_start_": CB.QUEST_START,
+    "quest_choice_": CB.QUEST_CHOICE,
+    "interact_": CB.INTERACT,
+    "end_interaction_": CB.END_INTERACTION,
+    "craft_check_": CB.CRAFT_CHECK,
+    "craft_confirm_": CB.CRAFT_CONFIRM,
+    "item_view_": CB.ITEM_VIEW
+}
+
+SQL_DISCOVER_CHARACTER = (
+    "INSERT OR IGNORE INTO user_progress (user_id, category, item_name, discovered, discovery_date) "
+    "VALUES (?, 'characters', ?, TRUE, CURRENT_TIMESTAMP)"
+)
+# Existence check only; served by the user_progress primary key
+SQL_QUEST_COMPLETED = (
+    "SELECT 1 FROM user_progress "
+    "WHERE user_id = ? AND category = 'quests' AND item_name = ? AND discovered = TRUE LIMIT 1"
+)
+SQL_RECIPES = "SELECT result_item, result_rarity, description, requirements FROM crafting_recipes"
+
+# Static keyboard rows and markups, built once and shared (telegram objects are immutable)
+_MAIN_MENU_ROW = [InlineKeyboardButton("« Back to Main Menu", callback_data="main_menu")]
+_ABANDON_ROW = [InlineKeyboardButton("Abandon Quest", callback_data="quest_abandon")]
+_BACK_TO_INVENTORY_ROW = [InlineKeyboardButton("« Back to Inventory", callback_data="inventory_back")]
+_MAIN_MENU_MARKUP = InlineKeyboardMarkup([_MAIN_MENU_ROW])
+# The main menu itself; also used by /start and the main_menu callback in main.py
+MAIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📜 Quests", callback_data="quests_menu")],
+    [InlineKeyboardButton("👥 Characters", callback_data="characters_menu")],
+    [InlineKeyboardButton("🎒 Inventory", callback_data="inventory_menu")],
+    [InlineKeyboardButton("📚 Lore", callback_data="lore_menu")]
+])
+_BACK_TO_INVENTORY_MARKUP = InlineKeyboardMarkup([_BACK_TO_INVENTORY_ROW])
+_BACK_TO_QUESTS_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("« Back to Quests", callback_data="quests_back")]])
+_BACK_TO_CHARACTERS_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("« Back to Characters", callback_data="interact_back")]])
+_BACK_TO_CRAFTING_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("« Back to Crafting", callback_data="inventory_craft")]])
+_BACK_TO_ITEMS_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("« Back to Items", callback_data="inventory_details")]])
+_ITEM_NOT_FOUND_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("« Back to Inventory", callback_data="inventory_details")]])
+_QUEST_COMPLETE_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("View Rewards", callback_data="quest_rewards")],
+    [InlineKeyboardButton("« Back to Quests", callback_data="quests_back")]
+])
+_INVENTORY_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("View Item Details", callback_data="inventory_details")],
+    [InlineKeyboardButton("Craft Items", callback_data="inventory_craft")],
+    _MAIN_MENU_ROW
+])
+
+# Display symbol and inventory section header per item rarity
+_RARITY_SYMBOL = {"Legendary": "✨", "Rare": "🔹", "Normal": "📦"}
+_RARITY_HEADER = {
+    "Legendary": "✨ <b>LEGENDARY ITEMS</b> ✨",
+    "Rare": "🔹 <b>RARE ITEMS</b> 🔹",
+    "Normal": "📦 <b>NORMAL ITEMS</b> 📦"
+}
+_RARITY_PRIORITY = {"Legendary": 0, "Rare": 1, "Normal": 2}
+
+@lru_cache(maxsize=4096)
+def _escape_name(name: str) -> str:
+    """HTML-escape an item, quest or character name for ParseMode.HTML.
+    
+    The same few names are rendered over and over, so the escaped form is cached.
+    """
+    return html.escape(name)
+
+def _rarity_sort_key(item: Dict) -> Tuple[int, str]:
+    """Order items Legendary, Rare, Normal, then any other rarity by name."""
+    return _RARITY_PRIORITY.get(item["rarity"], 99), item["rarity"]
+
+@lru_cache(maxsize=256)
+def _end_conversation_markup(character_name: str) -> InlineKeyboardMarkup:
+    """Get the "End Conversation" keyboard for a character."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(
+        "End Conversation",
+        callback_data=f"{CB.END_INTERACTION}|{character_name}"
+    )]])
+
+def _parse_legacy_callback(callback_data: str) -> Tuple[str, str]:
+    """Split an old "quest_view_<arg>"-style callback into (op, arg)."""
+    first, _, rest = callback_data.partition("_")
+    second, _, tail = rest.partition("_")
+    op = _LEGACY_PREFIXES.get(f"{first}_{second}_")
+    if op:
+        return op, tail
+    return _LEGACY_PREFIXES.get(f"{first}_", ""), rest
+
+def _freeze(info):
+    """Wrap a dict from the lore manager so cached copies can't be mutated."""
+    return MappingProxyType(info) if isinstance(info, dict) else info
+
 class QuestCommandHandlers:
     """Command handlers for quest-related features."""
     
-    def __init__(self, lore_manager: FangenLoreManager, db: Database, quest_manager: QuestManager):
+    def __init__(self, lore_manager: FangenLoreManager, db: Database, quest_manager: QuestManager,
+                 last_active_batcher: LastActiveBatcher):
         """Initialize quest command handlers."""
         self.lore_manager = lore_manager
         self.db = db
         self.quest_manager = quest_manager
+        # Shared with the lore handlers so users.last_active has a single writer
+        self.last_active_batcher = last_active_batcher
+        # Character/quest/item lookups, memoized per lore version
+        self._char_info = lru_cache(maxsize=512)(lambda name: _freeze(lore_manager.get_character_info(name)))
+        self._quest_info = lru_cache(maxsize=512)(lambda name: _freeze(lore_manager.get_quest_info(name)))
+        self._item_info = lru_cache(maxsize=512)(lambda name: _freeze(lore_manager.get_item_info(name)))
+        self._info_version = lore_manager.version
+        # Character each user is talking to; in-process only, the bot runs without persistence
+        self._active_char: Dict[int, str] = {}
+        # Crafting recipes are static reference data; loaded once, see invalidate_recipes()
+        self._recipes_cache = None
+        self._recipes_by_item: Dict[str, Dict] = {}
+        self._get_recipes()
+        # Callback routing: exact callback_data first, then "op|arg" -> handler(arg)
+        self._callback_exact = {
+            "quest_abandon": self._cb_quest_abandon,
+            "quest_rewards": self._cb_quest_rewards,
+            "quests_back": self.quests_command,
+            "interact_back": self.interact_command,
+            "craft_cancel": self._cb_craft_cancel,
+            "inventory_details": self._cb_inventory_details,
+            "inventory_back": self.inventory_command,
+            "inventory_craft": self.craft_command
+        }
+        self._callback_ops = {
+            CB.QUEST_VIEW: self._cb_quest_view,
+            CB.QUEST_START: self._cb_quest_start,
+            CB.QUEST_CHOICE: self._cb_quest_choice,
+            CB.INTERACT: self._cb_interact,
+            CB.END_INTERACTION: self._cb_end_interaction,
+            CB.CRAFT_CHECK: self._cb_craft_check,
+            CB.CRAFT_CONFIRM: self._cb_craft_confirm,
+            CB.ITEM_VIEW: self._cb_item_view
+        }
+    
+    def _check_info_version(self) -> None:
+        """Drop memoized lore lookups if the lore has been reloaded."""
+        if self._info_version != self.lore_manager.version:
+            self._char_info.cache_clear()
+            self._quest_info.cache_clear()
+            self._item_info.cache_clear()
+            self._info_version = self.lore_manager.version
+    
+    def get_character_info(self, character_name: str):
+        """Get read-only character info from the lore, cached by name."""
+        self._check_info_version()
+        return self._char_info(character_name)
+    
+    def get_quest_info(self, quest_name: str):
+        """Get read-only quest info from the lore, cached by name."""
+        self._check_info_version()
+        return self._quest_info(quest_name)
+    
+    def get_item_info(self, item_name: str):
+        """Get read-only item info from the lore, cached by name."""
+        self._check_info_version()
+        return self._item_info(item_name)
+    
+    def _get_recipes(self) -> List[Dict]:
+        """Get all crafting recipes, loading them on first use."""
+        if self._recipes_cache is None:
+            recipes = self.db.execute_query(SQL_RECIPES)
+            if recipes is None:
+                # Query failed; don't cache so the next call retries
+                return []
+            # Requirements are static, so parse the JSON once here
+            for recipe in recipes:
+                recipe["requirements_parsed"] = json.loads(recipe.get("requirements") or "{}")
+            self._recipes_cache = recipes
+            self._recipes_by_item = {recipe["result_item"]: recipe for recipe in recipes}
+        return self._recipes_cache
+    
+    def get_recipe_requirements(self, item_name: str) -> Dict[str, int]:
+        """Get the parsed component requirements for a crafting recipe.
+        
+        Args:
+            item_name: The item the recipe produces
+            
+        Returns:
+            Mapping of required item name to quantity, empty if unknown
+        """
+        self._get_recipes()
+        recipe = self._recipes_by_item.get(item_name)
+        return recipe["requirements_parsed"] if recipe else {}
+    
+    def invalidate_recipes(self) -> None:
+        """Reload crafting recipes on next use, e.g. after adding new ones."""
+        self._recipes_cache = None
+        self._recipes_by_item = {}
+    
+    async def _db(self, query: str, params: Tuple = ()) -> Optional[List[Dict]]:
+        """Shorthand for Database.execute_query_async."""
+        return await self.db.execute_query_async(query, params)
     
     async def quests_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle the /quests command to view available quests."""
         user_id = update.effective_user.id
         
         # Log user action
-        self.db.execute_query(
-            "UPDATE users SET last_active = CURRENT_TIMESTAMP WHERE user_id = ?",
-            (user_id,)
-        )
+        self.last_active_batcher.touch(user_id)
         
         # Get available quests
-        available_quests = self.quest_manager.get_available_quests(user_id)
+        available_quests = await self.db.run_async(self.quest_manager.get_available_quests, user_id)
         
         if not available_quests:
-            await update.message.reply_text(
+            await reply_or_edit(
+                update,
                 "No quests are available at the moment. "
                 "Continue exploring the world of Fangen to unlock new adventures."
             )
@@ -53,17 +275,18 @@ class QuestCommandHandlers:
             status = "✅" if quest["completed"] else "⏳"
             keyboard.append([InlineKeyboardButton(
                 f"{status} {quest['name']}",
-                callback_data=f"quest_view_{quest['name']}"
+                callback_data=f"{CB.QUEST_VIEW}|{quest['name']}"
             )])
         
-        keyboard.append([InlineKeyboardButton("« Back to Main Menu", callback_data="main_menu")])
+        keyboard.append(_MAIN_MENU_ROW)
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(
-            "📜 *Available Quests* 📜\n\n"
+        await reply_or_edit(
+            update,
+            "📜 <b>Available Quests</b> 📜\n\n"
             "Select a quest to view its details or begin the adventure:",
             reply_markup=reply_markup,
-            parse_mode='Markdown'
+            parse_mode=ParseMode.HTML
         )
     
     async def start_quest_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -83,26 +306,7 @@ class QuestCommandHandlers:
             await update.message.reply_text(message)
             return
         
-        # Format scene for display
-        narrative = scene_data.get("narrative", "")
-        choices = scene_data.get("choices", [])
-        
-        # Create choice buttons
-        keyboard = []
-        for choice in choices:
-            keyboard.append([InlineKeyboardButton(
-                choice["text"],
-                callback_data=f"quest_choice_{choice['id']}"
-            )])
-        
-        keyboard.append([InlineKeyboardButton("Abandon Quest", callback_data="quest_abandon")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            f"{message}\n\n{narrative}",
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        await self._render_scene(update.message.reply_text, message, scene_data)
     
     async def current_quest_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle the /currentquest command to view the current quest status."""
@@ -115,25 +319,26 @@ class QuestCommandHandlers:
             await update.message.reply_text(message)
             return
         
-        # Format scene for display
-        narrative = scene_data.get("narrative", "")
-        choices = scene_data.get("choices", [])
-        
-        # Create choice buttons
-        keyboard = []
-        for choice in choices:
-            keyboard.append([InlineKeyboardButton(
-                choice["text"],
-                callback_data=f"quest_choice_{choice['id']}"
-            )])
-        
-        keyboard.append([InlineKeyboardButton("Abandon Quest", callback_data="quest_abandon")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        await self._render_scene(update.message.reply_text, message, scene_data)
+    
+    async def _render_scene(self, send_fn, message: str, scene_data: Dict) -> None:
+        """Send a quest scene with one button per choice plus "Abandon Quest".
+        
+        Args:
+            send_fn: update.message.reply_text, or edit_message bound to the query
+            message: Status line shown above the narrative
+            scene_data: Scene from QuestManager with "narrative" and "choices"
+        """
+        keyboard = [
+            [InlineKeyboardButton(choice["text"], callback_data=f"{CB.QUEST_CHOICE}|{choice['id']}")]
+            for choice in scene_data.get("choices", [])
+        ]
+        keyboard.append(_ABANDON_ROW)
         
-        await update.message.reply_text(
-            f"{message}\n\n{narrative}",
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
+        await send_fn(
+            f"{html.escape(message)}\n\n{scene_data.get('narrative', '')}",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.HTML
         )
     
     async def abandon_quest_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -149,51 +354,28 @@ class QuestCommandHandlers:
         """Handle the /inventory command to view the user's inventory."""
         user_id = update.effective_user.id
         
-        # Get inventory
-        inventory = self.quest_manager.get_inventory(user_id)
+        # Get inventory (cached by QuestManager until it changes)
+        inventory = await self.db.run_async(self.quest_manager.get_inventory_map, user_id)
         
         if not inventory:
-            await update.message.reply_text(
+            await reply_or_edit(
+                update,
                 "Your inventory is empty. Complete quests and collect items to fill it."
             )
             return
         
-        # Format inventory for display
-        inventory_text = "🎒 *Your Inventory* 🎒\n\n"
-        
-        # Group by rarity
-        rarities = {"Legendary": [], "Rare": [], "Normal": []}
-        
-        for item in inventory:
-            rarities[item["rarity"]].append(item)
-        
-        # Display Legendary items first, then Rare, then Normal
-        for rarity, items in rarities.items():
-            if items:
-                if rarity == "Legendary":
-                    inventory_text += "✨ *LEGENDARY ITEMS* ✨\n"
-                elif rarity == "Rare":
-                    inventory_text += "🔹 *RARE ITEMS* 🔹\n"
-                else:
-                    inventory_text += "📦 *NORMAL ITEMS* 📦\n"
-                
-                for item in items:
-                    inventory_text += f"• {item['name']} (x{item['quantity']})\n"
-                
-                inventory_text += "\n"
-        
-        # Create keyboard
-        keyboard = [
-            [InlineKeyboardButton("View Item Details", callback_data="inventory_details")],
-            [InlineKeyboardButton("Craft Items", callback_data="inventory_craft")],
-            [InlineKeyboardButton("« Back to Main Menu", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            inventory_text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
+        # Sort once by rarity priority (unknown rarities last) and emit a header per run
+        parts = ["🎒 <b>Your Inventory</b> 🎒", ""]
+        for rarity, items in groupby(sorted(inventory.values(), key=_rarity_sort_key), key=itemgetter("rarity")):
+            parts.append(_RARITY_HEADER.get(rarity) or f"📦 <b>{html.escape(rarity.upper())} ITEMS</b> 📦")
+            parts.extend(f"• {_escape_name(item['name'])} (x{item['quantity']})" for item in items)
+            parts.append("")
+        
+        await reply_or_edit(
+            update,
+            "\n".join(parts),
+            reply_markup=_INVENTORY_MARKUP,
+            parse_mode=ParseMode.HTML
         )
     
     async def craft_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -203,12 +385,11 @@ class QuestCommandHandlers:
         
         if not item_name:
             # Show available recipes
-            recipes = self.db.execute_query(
-                "SELECT result_item, result_rarity, description FROM crafting_recipes"
-            )
+            recipes = self._get_recipes()
             
             if not recipes:
-                await update.message.reply_text(
+                await reply_or_edit(
+                    update,
                     "No crafting recipes are available. Discover more recipes by exploring the world."
                 )
                 return
@@ -216,54 +397,57 @@ class QuestCommandHandlers:
             # Create recipe buttons
             keyboard = []
             for recipe in recipes:
-                rarity_symbol = "✨" if recipe["result_rarity"] == "Legendary" else "🔹" if recipe["result_rarity"] == "Rare" else "📦"
+                rarity_symbol = _RARITY_SYMBOL.get(recipe["result_rarity"], "📦")
                 keyboard.append([InlineKeyboardButton(
                     f"{rarity_symbol} {recipe['result_item']}",
-                    callback_data=f"craft_check_{recipe['result_item']}"
+                    callback_data=f"{CB.CRAFT_CHECK}|{recipe['result_item']}"
                 )])
             
-            keyboard.append([InlineKeyboardButton("« Back to Inventory", callback_data="inventory_back")])
+            keyboard.append(_BACK_TO_INVENTORY_ROW)
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            await update.message.reply_text(
-                "🔨 *Crafting Workshop* 🔨\n\n"
+            await reply_or_edit(
+                update,
+                "🔨 <b>Crafting Workshop</b> 🔨\n\n"
                 "Select an item to craft:",
                 reply_markup=reply_markup,
-                parse_mode='Markdown'
+                parse_mode=ParseMode.HTML
             )
             return
         
         # Check if user can craft the item
-        can_craft, message, details = self.db.can_craft_item(user_id, item_name)
+        can_craft, message, details = await self.db.run_async(self.db.can_craft_item, user_id, item_name)
         
         if not can_craft:
             missing_items = details.get("missing", [])
-            missing_text = "\n".join([f"• {item}" for item in missing_items])
+            missing_text = "\n".join(f"• {item}" for item in missing_items)
             
-            await update.message.reply_text(
+            await reply_or_edit(
+                update,
                 f"{message}\n\n{missing_text}\n\nContinue your adventures to gather the required components."
             )
             return
         
         # Create confirmation button
         keyboard = [
-            [InlineKeyboardButton("Craft Now", callback_data=f"craft_confirm_{item_name}")],
+            [InlineKeyboardButton("Craft Now", callback_data=f"{CB.CRAFT_CONFIRM}|{item_name}")],
             [InlineKeyboardButton("Cancel", callback_data="craft_cancel")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         recipe = details.get("recipe", {})
-        requirements = json.loads(recipe.get("requirements", "{}"))
-        req_text = "\n".join([f"• {item} x{qty}" for item, qty in requirements.items()])
+        requirements = self.get_recipe_requirements(item_name)
+        req_text = "\n".join(f"• {_escape_name(item)} x{qty}" for item, qty in requirements.items())
         
-        await update.message.reply_text(
-            f"📜 *Crafting {item_name}* 📜\n\n"
-            f"Description: {recipe.get('description', '')}\n\n"
+        await reply_or_edit(
+            update,
+            f"📜 <b>Crafting {_escape_name(item_name)}</b> 📜\n\n"
+            f"Description: {html.escape(recipe.get('description', ''))}\n\n"
             f"Required Components:\n{req_text}\n\n"
-            f"This will create: 1x {item_name} ({recipe.get('result_rarity', 'Normal')})\n\n"
+            f"This will create: 1x {_escape_name(item_name)} ({html.escape(recipe.get('result_rarity', 'Normal'))})\n\n"
             f"Proceed with crafting?",
             reply_markup=reply_markup,
-            parse_mode='Markdown'
+            parse_mode=ParseMode.HTML
         )
     
     async def interact_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -272,65 +456,54 @@ class QuestCommandHandlers:
         character_name = ' '.join(context.args) if context.args else None
         
         # Log user action
-        self.db.execute_query(
-            "UPDATE users SET last_active = CURRENT_TIMESTAMP WHERE user_id = ?",
-            (user_id,)
-        )
+        self.last_active_batcher.touch(user_id)
         
         if not character_name:
             # Show available characters
             characters = self.lore_manager.get_characters()
             
             if not characters:
-                await update.message.reply_text(
+                await reply_or_edit(
+                    update,
                     "No characters are available for interaction at the moment. "
                     "Check back later as the world of Fangen continues to unfold."
                 )
                 return
             
             # Create keyboard with characters
-            keyboard = []
-            for i in range(0, len(characters), 2):
-                row = []
-                row.append(InlineKeyboardButton(
-                    characters[i], 
-                    callback_data=f"interact_{characters[i]}"
-                ))
-                if i + 1 < len(characters):
-                    row.append(InlineKeyboardButton(
-                        characters[i+1], 
-                        callback_data=f"interact_{characters[i+1]}"
-                    ))
-                keyboard.append(row)
+            # Two characters per row; an odd count leaves the last row with one
+            keyboard = [
+                [InlineKeyboardButton(name, callback_data=f"{CB.INTERACT}|{name}")
+                 for name in pair if name is not None]
+                for pair in zip_longest(characters[::2], characters[1::2])
+            ]
             
             # Add back button
-            keyboard.append([InlineKeyboardButton("« Back to Main Menu", callback_data="main_menu")])
+            keyboard.append(_MAIN_MENU_ROW)
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            await update.message.reply_text(
-                "👥 *Characters of Fangen* 👥\n\n"
+            await reply_or_edit(
+                update,
+                "👥 <b>Characters of Fangen</b> 👥\n\n"
                 "Who would you like to interact with?",
                 reply_markup=reply_markup,
-                parse_mode='Markdown'
+                parse_mode=ParseMode.HTML
             )
             return
         
         # Start interaction with the character
         # Mark character as discovered
-        self.db.execute_query(
-            "INSERT OR IGNORE INTO user_progress (user_id, category, item_name, discovered, discovery_date) "
-            "VALUES (?, 'characters', ?, TRUE, CURRENT_TIMESTAMP)",
-            (user_id, character_name)
-        )
+        await self._db(SQL_DISCOVER_CHARACTER, (user_id, character_name))
         
-        # Store the active character in user context
-        context.user_data['active_character'] = character_name
+        # Remember who the user is talking to for handle_character_message
+        self._active_char[user_id] = character_name
         
         # Get character info
-        character_info = self.lore_manager.get_character_info(character_name)
+        character_info = self.get_character_info(character_name)
         
         if not character_info:
-            await update.message.reply_text(
+            await reply_or_edit(
+                update,
                 f"Character '{character_name}' not found. Use /interact to see available characters."
             )
             return
@@ -340,27 +513,24 @@ class QuestCommandHandlers:
         personality = character_info.get("personality", "")
         role = character_info.get("role", "")
         
-        intro = f"You are now speaking with *{character_name}*.\n\n"
+        intro = f"You are now speaking with <b>{_escape_name(character_name)}</b>.\n\n"
         
         if role:
-            intro += f"*Role*: {role}\n\n"
+            intro += f"<b>Role</b>: {html.escape(role)}\n\n"
         
         if isinstance(personality, str) and personality:
-            intro += f"*{character_name}* stands before you, their demeanor suggesting someone who is {personality.lower()}.\n\n"
+            intro += f"<b>{_escape_name(character_name)}</b> stands before you, their demeanor suggesting someone who is {html.escape(personality.lower())}.\n\n"
         
         intro += "You may now speak with them. Type your message to continue the conversation."
         
         # Add end conversation button
-        keyboard = [[InlineKeyboardButton(
-            "End Conversation", 
-            callback_data=f"end_interaction_{character_name}"
-        )]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = _end_conversation_markup(character_name)
         
-        await update.message.reply_text(
+        await reply_or_edit(
+            update,
             intro,
             reply_markup=reply_markup,
-            parse_mode='Markdown'
+            parse_mode=ParseMode.HTML
         )
     
     async def handle_character_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -369,7 +539,7 @@ class QuestCommandHandlers:
         message_text = update.message.text
         
         # Check if user is in an active character interaction
-        active_character = context.user_data.get('active_character')
+        active_character = self._active_char.get(user_id)
         
         if not active_character:
             # Not in a character interaction, handle as normal message
@@ -378,456 +548,395 @@ class QuestCommandHandlers:
         # Get character response
         response = self.quest_manager.get_character_response(user_id, active_character, message_text)
         
-        # Update character relationship
-        self.db.execute_query(
-            "INSERT OR IGNORE INTO character_relationships (user_id, character_name, relationship_level, last_interaction) "
-            "VALUES (?, ?, 0, CURRENT_TIMESTAMP)",
-            (user_id, active_character)
-        )
-        
-        self.db.execute_query(
-            "UPDATE character_relationships SET last_interaction = CURRENT_TIMESTAMP WHERE user_id = ? AND character_name = ?",
-            (user_id, active_character)
-        )
+        # Update character relationship (created on first interaction)
+        await self._db(SQL_TOUCH_RELATIONSHIP, (user_id, active_character))
         
         # Add end conversation button
-        keyboard = [[InlineKeyboardButton(
-            "End Conversation", 
-            callback_data=f"end_interaction_{active_character}"
-        )]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = _end_conversation_markup(active_character)
         
         await update.message.reply_text(
-            f"*{active_character}*: {response}",
+            f"<b>{_escape_name(active_character)}</b>: {response}",
             reply_markup=reply_markup,
-            parse_mode='Markdown'
+            parse_mode=ParseMode.HTML
         )
         
         return True  # Message handled
     
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle callback queries from inline keyboards."""
+        """Handle callback queries from inline keyboards.
+        
+        The query has already been answered by main.handle_callback.
+        """
         query = update.callback_query
-        await query.answer()
         
         callback_data = query.data
         user_id = update.effective_user.id
+        self.last_active_batcher.touch(user_id)
         
-        logger.debug(f"Callback data: {callback_data}")
+        logger.debug("Callback data: %s", callback_data)
         
-        # Quest view callbacks
-        if callback_data.startswith("quest_view_"):
-            quest_name = callback_data.replace("quest_view_", "")
-            quest_info = self.lore_manager.get_quest_info(quest_name)
-            
-            if not quest_info:
-                await query.edit_message_text(
-                    f"Details for quest '{quest_name}' not found."
-                )
+        # HOT: "op|arg" buttons (quest choices, character interactions) go straight
+        # to their handler; no exact-match name contains the separator
+        op, sep, arg = callback_data.partition(CB.SEP)
+        if sep:
+            handler = self._callback_ops.get(op)
+            if handler:
+                await handler(update, context, arg)
                 return
-            
-            # Check if quest is completed
-            completed = self.db.execute_query(
-                "SELECT * FROM user_progress WHERE user_id = ? AND category = 'quests' AND item_name = ? AND discovered = TRUE",
-                (user_id, quest_name)
-            )
-            
-            status = "✅ Completed" if completed else "⏳ Available"
-            
-            # Create keyboard
-            keyboard = [
-                [InlineKeyboardButton(
-                    "Start Quest" if not completed else "Replay Quest",
-                    callback_data=f"quest_start_{quest_name}"
-                )],
-                [InlineKeyboardButton("« Back to Quests", callback_data="quests_back")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                f"📜 *{quest_name}* 📜\n\n"
-                f"Status: {status}\n\n"
-                f"{quest_info.get('description', '')}\n\n"
-                f"Are you ready to embark on this adventure?",
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
-        
-        # Quest start callbacks
-        elif callback_data.startswith("quest_start_"):
-            quest_name = callback_data.replace("quest_start_", "")
-            
-            # Start the quest
-            success, message, scene_data = self.quest_manager.start_quest(user_id, quest_name)
-            
-            if not success:
-                await query.edit_message_text(message)
-                return
-            
-            # Format scene for display
-            narrative = scene_data.get("narrative", "")
-            choices = scene_data.get("choices", [])
-            
-            # Create choice buttons
-            keyboard = []
-            for choice in choices:
-                keyboard.append([InlineKeyboardButton(
-                    choice["text"],
-                    callback_data=f"quest_choice_{choice['id']}"
-                )])
-            
-            keyboard.append([InlineKeyboardButton("Abandon Quest", callback_data="quest_abandon")])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                f"{message}\n\n{narrative}",
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
-        
-        # Quest choice callbacks
-        elif callback_data.startswith("quest_choice_"):
-            choice_id = callback_data.replace("quest_choice_", "")
-            
-            # Process the choice
-            success, message, scene_data = self.quest_manager.make_choice(user_id, choice_id)
-            
-            if not success:
-                await query.edit_message_text(message)
+        else:
+            # COLD: menu/navigation buttons, matched exactly so e.g. "interact_back"
+            # isn't taken as a character name
+            handler = self._callback_exact.get(callback_data)
+            if handler:
+                await handler(update, context)
                 return
             
-            # Check if quest ended
-            if scene_data.get("type") == "quest_end":
-                title = scene_data.get("title", "")
-                text = scene_data.get("text", "")
-                
-                # Create end buttons
-                keyboard = [
-                    [InlineKeyboardButton("View Rewards", callback_data="quest_rewards")],
-                    [InlineKeyboardButton("« Back to Quests", callback_data="quests_back")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                await query.edit_message_text(
-                    f"*{title}*\n\n{text}",
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
+            # COLD: buttons from messages sent before the compact format
+            op, arg = _parse_legacy_callback(callback_data)
+            handler = self._callback_ops.get(op)
+            if handler:
+                await handler(update, context, arg)
                 return
-            
-            # Format scene for display
-            narrative = scene_data.get("narrative", "")
-            choices = scene_data.get("choices", [])
-            
-            # Create choice buttons
-            keyboard = []
-            for choice in choices:
-                keyboard.append([InlineKeyboardButton(
-                    choice["text"],
-                    callback_data=f"quest_choice_{choice['id']}"
-                )])
-            
-            keyboard.append([InlineKeyboardButton("Abandon Quest", callback_data="quest_abandon")])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                f"{message}\n\n{narrative}",
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
         
-        # Quest abandon callback
-        elif callback_data == "quest_abandon":
-            # Abandon the quest
-            success, message = self.quest_manager.abandon_quest(user_id)
-            
-            # Create back button
-            keyboard = [[InlineKeyboardButton("« Back to Quests", callback_data="quests_back")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                message,
-                reply_markup=reply_markup
+        logger.debug("Unhandled quest callback: %s", callback_data)
+    
+    async def _cb_quest_view(self, update: Update, context: ContextTypes.DEFAULT_TYPE, quest_name: str) -> None:
+        """Show a quest's details and status."""
+        query = update.callback_query
+        user_id = update.effective_user.id
+        
+        quest_info = self.get_quest_info(quest_name)
+        
+        if not quest_info:
+            await edit_message(
+                query,
+                f"Details for quest '{quest_name}' not found."
             )
+            return
         
-        # Quest rewards callback
-        elif callback_data == "quest_rewards":
-            # Get inventory updates from recently completed quest
-            if user_id in self.quest_manager.active_quests:
-                quest_state = self.quest_manager.active_quests[user_id]
-                inventory_updates = quest_state.get("inventory_updates", [])
-                
-                updates_text = "\n".join([f"• {update}" for update in inventory_updates]) if inventory_updates else "No rewards found."
-                
-                # Create back button
-                keyboard = [[InlineKeyboardButton("« Back to Quests", callback_data="quests_back")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                await query.edit_message_text(
-                    f"🏆 *Quest Rewards* 🏆\n\n{updates_text}",
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-            else:
-                await query.edit_message_text(
-                    "No active quest found.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("« Back to Quests", callback_data="quests_back")]])
-                )
+        # Check if quest is completed
+        completed = await self._db(SQL_QUEST_COMPLETED, (user_id, quest_name))
         
-        # Back to quests callback
-        elif callback_data == "quests_back":
-            await self.quests_command(update, context)
+        status = "✅ Completed" if completed else "⏳ Available"
         
-        # Interact callbacks
-        elif callback_data.startswith("interact_"):
-            character_name = callback_data.replace("interact_", "")
-            
-            # Store the active character in user context
-            context.user_data['active_character'] = character_name
-            
-            # Get character info
-            character_info = self.lore_manager.get_character_info(character_name)
-            
-            if not character_info:
-                await query.edit_message_text(
-                    f"Character '{character_name}' not found."
-                )
-                return
-            
-            # Mark character as discovered
-            self.db.execute_query(
-                "INSERT OR IGNORE INTO user_progress (user_id, category, item_name, discovered, discovery_date) "
-                "VALUES (?, 'characters', ?, TRUE, CURRENT_TIMESTAMP)",
-                (user_id, character_name)
-            )
-            
-            # Create introduction message
-            backstory = character_info.get("backstory", "")
-            personality = character_info.get("personality", "")
-            role = character_info.get("role", "")
-            
-            intro = f"You are now speaking with *{character_name}*.\n\n"
-            
-            if role:
-                intro += f"*Role*: {role}\n\n"
-            
-            if isinstance(personality, str) and personality:
-                intro += f"*{character_name}* stands before you, their demeanor suggesting someone who is {personality.lower()}.\n\n"
-            
-            intro += "You may now speak with them. Type your message to continue the conversation."
+        # Create keyboard
+        keyboard = [
+            [InlineKeyboardButton(
+                "Start Quest" if not completed else "Replay Quest",
+                callback_data=f"{CB.QUEST_START}|{quest_name}"
+            )],
+            [InlineKeyboardButton("« Back to Quests", callback_data="quests_back")]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await edit_message(
+            query,
+            f"📜 <b>{_escape_name(quest_name)}</b> 📜\n\n"
+            f"Status: {status}\n\n"
+            f"{html.escape(quest_info.get('description', ''))}\n\n"
+            f"Are you ready to embark on this adventure?",
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.HTML
+        )
+    
+    async def _cb_quest_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE, quest_name: str) -> None:
+        """Start a quest and show its first scene."""
+        query = update.callback_query
+        user_id = update.effective_user.id
+        
+        # Start the quest
+        success, message, scene_data = self.quest_manager.start_quest(user_id, quest_name)
+        
+        if not success:
+            await edit_message(query, message)
+            return
+        
+        await self._render_scene(partial(edit_message, query), message, scene_data)
+    
+    async def _cb_quest_choice(self, update: Update, context: ContextTypes.DEFAULT_TYPE, choice_id: str) -> None:
+        """Apply a quest choice and show the next scene or the ending."""
+        query = update.callback_query
+        user_id = update.effective_user.id
+        
+        # Process the choice (QuestManager drops its inventory map if items change)
+        success, message, scene_data = self.quest_manager.make_choice(user_id, choice_id)
+        
+        if not success:
+            await edit_message(query, message)
+            return
+        
+        # Check if quest ended
+        if scene_data.get("type") == "quest_end":
+            title = scene_data.get("title", "")
+            text = scene_data.get("text", "")
             
-            # Add end conversation button
-            keyboard = [[InlineKeyboardButton(
-                "End Conversation", 
-                callback_data=f"end_interaction_{character_name}"
-            )]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = _QUEST_COMPLETE_MARKUP
             
-            await query.edit_message_text(
-                intro,
+            await edit_message(
+                query,
+                f"<b>{html.escape(title)}</b>\n\n{html.escape(text)}",
                 reply_markup=reply_markup,
-                parse_mode='Markdown'
+                parse_mode=ParseMode.HTML
             )
+            return
+        
+        await self._render_scene(partial(edit_message, query), message, scene_data)
+    
+    async def _cb_quest_abandon(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Abandon the current quest."""
+        query = update.callback_query
+        user_id = update.effective_user.id
+        
+        # Abandon the quest
+        success, message = self.quest_manager.abandon_quest(user_id)
+        
+        # Create back button
+        reply_markup = _BACK_TO_QUESTS_MARKUP
+        
+        await edit_message(
+            query,
+            message,
+            reply_markup=reply_markup
+        )
+    
+    async def _cb_quest_rewards(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Show rewards from the most recent quest."""
+        query = update.callback_query
+        user_id = update.effective_user.id
         
-        # End interaction callbacks
-        elif callback_data.startswith("end_interaction_"):
-            character_name = callback_data.replace("end_interaction_", "")
+        # Get inventory updates from recently completed quest
+        if user_id in self.quest_manager.active_quests:
+            quest_state = self.quest_manager.active_quests[user_id]
+            inventory_updates = quest_state.get("inventory_updates", [])
             
-            # Clear active character
-            if 'active_character' in context.user_data:
-                del context.user_data['active_character']
+            updates_text = "\n".join(f"• {html.escape(str(update))}" for update in inventory_updates) if inventory_updates else "No rewards found."
             
             # Create back button
-            keyboard = [[InlineKeyboardButton("« Back to Characters", callback_data="interact_back")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = _BACK_TO_QUESTS_MARKUP
             
-            await query.edit_message_text(
-                f"Your conversation with *{character_name}* has ended.",
+            await edit_message(
+                query,
+                f"🏆 <b>Quest Rewards</b> 🏆\n\n{updates_text}",
                 reply_markup=reply_markup,
-                parse_mode='Markdown'
+                parse_mode=ParseMode.HTML
+            )
+        else:
+            await edit_message(
+                query,
+                "No active quest found.",
+                reply_markup=_BACK_TO_QUESTS_MARKUP
             )
+    
+    async def _cb_interact(self, update: Update, context: ContextTypes.DEFAULT_TYPE, character_name: str) -> None:
+        """Begin a conversation with a character."""
+        query = update.callback_query
+        user_id = update.effective_user.id
         
-        # Back to characters callback
-        elif callback_data == "interact_back":
-            await self.interact_command(update, context)
+        # Remember who the user is talking to for handle_character_message
+        self._active_char[user_id] = character_name
         
-        # Crafting callbacks
-        elif callback_data.startswith("craft_check_"):
-            item_name = callback_data.replace("craft_check_", "")
-            
-            # Check if user can craft the item
-            can_craft, message, details = self.db.can_craft_item(user_id, item_name)
-            
-            if not can_craft:
-                missing_items = details.get("missing", [])
-                missing_text = "\n".join([f"• {item}" for item in missing_items]) if missing_items else "No specific requirements found."
-                
-                # Create back button
-                keyboard = [[InlineKeyboardButton("« Back to Crafting", callback_data="inventory_craft")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                await query.edit_message_text(
-                    f"{message}\n\n{missing_text}\n\nContinue your adventures to gather the required components.",
-                    reply_markup=reply_markup
-                )
-                return
-            
-            # Create confirmation button
-            keyboard = [
-                [InlineKeyboardButton("Craft Now", callback_data=f"craft_confirm_{item_name}")],
-                [InlineKeyboardButton("Cancel", callback_data="craft_cancel")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            recipe = details.get("recipe", {})
-            requirements = json.loads(recipe.get("requirements", "{}"))
-            req_text = "\n".join([f"• {item} x{qty}" for item, qty in requirements.items()]) if requirements else "No requirements needed."
-            
-            await query.edit_message_text(
-                f"📜 *Crafting {item_name}* 📜\n\n"
-                f"Description: {recipe.get('description', '')}\n\n"
-                f"Required Components:\n{req_text}\n\n"
-                f"This will create: 1x {item_name} ({recipe.get('result_rarity', 'Normal')})\n\n"
-                f"Proceed with crafting?",
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
+        # Get character info
+        character_info = self.get_character_info(character_name)
+        
+        if not character_info:
+            await edit_message(
+                query,
+                f"Character '{character_name}' not found."
             )
+            return
         
-        # Craft confirm callbacks
-        elif callback_data.startswith("craft_confirm_"):
-            item_name = callback_data.replace("craft_confirm_", "")
-            
-            # Craft the item
-            success, message = self.db.craft_item(user_id, item_name)
+        # Mark character as discovered
+        await self._db(SQL_DISCOVER_CHARACTER, (user_id, character_name))
+        
+        # Create introduction message
+        backstory = character_info.get("backstory", "")
+        personality = character_info.get("personality", "")
+        role = character_info.get("role", "")
+        
+        intro = f"You are now speaking with <b>{_escape_name(character_name)}</b>.\n\n"
+        
+        if role:
+            intro += f"<b>Role</b>: {html.escape(role)}\n\n"
+        
+        if isinstance(personality, str) and personality:
+            intro += f"<b>{_escape_name(character_name)}</b> stands before you, their demeanor suggesting someone who is {html.escape(personality.lower())}.\n\n"
+        
+        intro += "You may now speak with them. Type your message to continue the conversation."
+        
+        # Add end conversation button
+        reply_markup = _end_conversation_markup(character_name)
+        
+        await edit_message(
+            query,
+            intro,
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.HTML
+        )
+    
+    async def _cb_end_interaction(self, update: Update, context: ContextTypes.DEFAULT_TYPE, character_name: str) -> None:
+        """End the current character conversation."""
+        query = update.callback_query
+        
+        # Clear active character
+        self._active_char.pop(update.effective_user.id, None)
+        
+        # Create back button
+        reply_markup = _BACK_TO_CHARACTERS_MARKUP
+        
+        await edit_message(
+            query,
+            f"Your conversation with <b>{_escape_name(character_name)}</b> has ended.",
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.HTML
+        )
+    
+    async def _cb_craft_check(self, update: Update, context: ContextTypes.DEFAULT_TYPE, item_name: str) -> None:
+        """Check crafting requirements and ask for confirmation."""
+        query = update.callback_query
+        user_id = update.effective_user.id
+        
+        # Check if user can craft the item
+        can_craft, message, details = await self.db.run_async(self.db.can_craft_item, user_id, item_name)
+        
+        if not can_craft:
+            missing_items = details.get("missing", [])
+            missing_text = "\n".join(f"• {item}" for item in missing_items) if missing_items else "No specific requirements found."
             
             # Create back button
-            keyboard = [[InlineKeyboardButton("« Back to Inventory", callback_data="inventory_back")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = _BACK_TO_CRAFTING_MARKUP
             
-            await query.edit_message_text(
-                message,
+            await edit_message(
+                query,
+                f"{message}\n\n{missing_text}\n\nContinue your adventures to gather the required components.",
                 reply_markup=reply_markup
             )
+            return
         
-        # Craft cancel callback
-        elif callback_data == "craft_cancel":
-            # Create back button
-            keyboard = [[InlineKeyboardButton("« Back to Crafting", callback_data="inventory_craft")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                "Crafting canceled.",
-                reply_markup=reply_markup
-            )
+        # Create confirmation button
+        keyboard = [
+            [InlineKeyboardButton("Craft Now", callback_data=f"{CB.CRAFT_CONFIRM}|{item_name}")],
+            [InlineKeyboardButton("Cancel", callback_data="craft_cancel")]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
         
-        # Inventory details callback
-        elif callback_data == "inventory_details":
-            # Get inventory
-            inventory = self.quest_manager.get_inventory(user_id)
-            
-            if not inventory:
-                await query.edit_message_text(
-                    "Your inventory is empty.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("« Back to Main Menu", callback_data="main_menu")]])
-                )
-                return
-            
-            # Create item buttons
-            keyboard = []
-            for item in inventory:
-                keyboard.append([InlineKeyboardButton(
-                    f"{item['name']} (x{item['quantity']})",
-                    callback_data=f"item_view_{item['name']}"
-                )])
-            
-            keyboard.append([InlineKeyboardButton("« Back to Inventory", callback_data="inventory_back")])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                "🔍 *Item Details* 🔍\n\n"
-                "Select an item to view its details:",
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
+        recipe = details.get("recipe", {})
+        requirements = self.get_recipe_requirements(item_name)
+        req_text = "\n".join(f"• {_escape_name(item)} x{qty}" for item, qty in requirements.items()) if requirements else "No requirements needed."
         
-        # Item view callbacks
-        elif callback_data.startswith("item_view_"):
-            item_name = callback_data.replace("item_view_", "")
-            
-            # Get item details
-            item_info = self.lore_manager.get_item_info(item_name)
-            
-            if not item_info:
-                await query.edit_message_text(
-                    f"Details for item '{item_name}' not found.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("« Back to Inventory", callback_data="inventory_details")]])
-                )
-                return
-            
-            # Get item quantity
-            item_quantity = 0
-            inventory = self.quest_manager.get_inventory(user_id)
-            for item in inventory:
-                if item['name'] == item_name:
-                    item_quantity = item['quantity']
-                    break
-            
-            # Format item details
-            rarity = "Normal"
-            description = ""
-            
-            if isinstance(item_info, dict):
-                rarity = item_info.get("rarity", "Normal")
-                description = item_info.get("description", "")
-            else:
-                description = item_info
-            
-            # Create back button
-            keyboard = [[InlineKeyboardButton("« Back to Items", callback_data="inventory_details")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                f"📦 *{item_name}* 📦\n\n"
-                f"Rarity: {rarity}\n"
-                f"Quantity: {item_quantity}\n\n"
-                f"Description: {description}",
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
+        await edit_message(
+            query,
+            f"📜 <b>Crafting {_escape_name(item_name)}</b> 📜\n\n"
+            f"Description: {html.escape(recipe.get('description', ''))}\n\n"
+            f"Required Components:\n{req_text}\n\n"
+            f"This will create: 1x {_escape_name(item_name)} ({html.escape(recipe.get('result_rarity', 'Normal'))})\n\n"
+            f"Proceed with crafting?",
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.HTML
+        )
+    
+    async def _cb_craft_confirm(self, update: Update, context: ContextTypes.DEFAULT_TYPE, item_name: str) -> None:
+        """Craft an item."""
+        query = update.callback_query
+        user_id = update.effective_user.id
+        
+        # Craft the item
+        success, message = await self.db.run_async(self.db.craft_item, user_id, item_name)
+        self.quest_manager.invalidate_inventory(user_id)
+        
+        # Create back button
+        reply_markup = _BACK_TO_INVENTORY_MARKUP
+        
+        await edit_message(
+            query,
+            message,
+            reply_markup=reply_markup
+        )
+    
+    async def _cb_craft_cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Cancel crafting."""
+        query = update.callback_query
+        
+        # Create back button
+        reply_markup = _BACK_TO_CRAFTING_MARKUP
+        
+        await edit_message(
+            query,
+            "Crafting canceled.",
+            reply_markup=reply_markup
+        )
+    
+    async def _cb_inventory_details(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """List inventory items to view details for."""
+        query = update.callback_query
+        user_id = update.effective_user.id
+        
+        # Get inventory (cached by QuestManager until it changes)
+        inventory = await self.db.run_async(self.quest_manager.get_inventory_map, user_id)
+        
+        if not inventory:
+            await edit_message(
+                query,
+                "Your inventory is empty.",
+                reply_markup=_MAIN_MENU_MARKUP
             )
+            return
         
-        # Back to inventory callback
-        elif callback_data == "inventory_back":
-            await self.inventory_command(update, context)
+        # Create item buttons
+        keyboard = [
+            [InlineKeyboardButton(f"{item['name']} (x{item['quantity']})", callback_data=f"{CB.ITEM_VIEW}|{item['name']}")]
+            for item in inventory.values()
+        ]
+        keyboard.append(_BACK_TO_INVENTORY_ROW)
+        reply_markup = InlineKeyboardMarkup(keyboard)
         
-        # Inventory craft callback
-        elif callback_data == "inventory_craft":
-            await self.craft_command(update, context)
+        await edit_message(
+            query,
+            "🔍 <b>Item Details</b> 🔍\n\n"
+            "Select an item to view its details:",
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.HTML
+        )
+    
+    async def _cb_item_view(self, update: Update, context: ContextTypes.DEFAULT_TYPE, item_name: str) -> None:
+        """Show details for one inventory item."""
+        query = update.callback_query
+        user_id = update.effective_user.id
         
-        # Main menu callback
-        elif callback_data == "main_menu":
-            # Create main menu
-            keyboard = [
-                [InlineKeyboardButton("📜 Quests", callback_data="quests_menu")],
-                [InlineKeyboardButton("👥 Characters", callback_data="characters_menu")],
-                [InlineKeyboardButton("🎒 Inventory", callback_data="inventory_menu")],
-                [InlineKeyboardButton("📚 Lore", callback_data="lore_menu")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                f"Welcome to the world of Fangen! I am {BOT_NAME}, your guide through this mystical realm.\n\n"
-                f"What would you like to explore today?",
-                reply_markup=reply_markup
+        # Get item details
+        item_info = self.get_item_info(item_name)
+        
+        if not item_info:
+            await edit_message(
+                query,
+                f"Details for item '{item_name}' not found.",
+                reply_markup=_ITEM_NOT_FOUND_MARKUP
             )
+            return
         
-        # Menu redirects
-        elif callback_data == "quests_menu":
-            await self.quests_command(update, context)
-        elif callback_data == "characters_menu":
-            await self.interact_command(update, context)
-        elif callback_data == "inventory_menu":
-            await self.inventory_command(update, context)
-        elif callback_data == "lore_menu":
-            # Redirect to lore command
-            # This would be handled by another class
-            pass
\ No newline at end of file
+        # Get item quantity
+        inventory_map = await self.db.run_async(self.quest_manager.get_inventory_map, user_id)
+        item = inventory_map.get(item_name)
+        item_quantity = item["quantity"] if item else 0
+        
+        # Format item details
+        rarity = "Normal"
+        description = ""
+        
+        if isinstance(item_info, Mapping):
+            rarity = item_info.get("rarity", "Normal")
+            description = item_info.get("description", "")
+        else:
+            description = item_info
+        
+        # Create back button
+        reply_markup = _BACK_TO_ITEMS_MARKUP
+        
+        await edit_message(
+            query,
+            f"📦 <b>{_escape_name(item_name)}</b> 📦\n\n"
+            f"Rarity: {html.escape(rarity)}\n"
+            f"Quantity: {item_quantity}\n\n"
+            f"Description: {html.escape(description)}",
+            reply_markup=reply_markup,
+            parse_mode=ParseMode.HTML
+        )
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Shared fixtures for the ChuzoBot tests
+"""
+
+import itertools
+import os
+import shutil
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from utils.database import Database
+from utils.fangen_lore_manager import FangenLoreManager
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every fake callback gets its own message, so EditCoalescer never holds an edit back
+_message_ids = itertools.count(1)
+
+def make_database(tmp_dir: str) -> Database:
+    """Create a set-up SQLite database in tmp_dir/data instead of the repository's.
+
+    Args:
+        tmp_dir: Directory that owns the database for this test
+
+    Returns:
+        Database with all tables created
+    """
+    cwd = os.getcwd()
+    os.chdir(tmp_dir)
+    try:
+        db = Database()
+        db.setup()
+    finally:
+        os.chdir(cwd)
+    return db
+
+def make_lore_manager(tmp_dir: str) -> FangenLoreManager:
+    """Create a lore manager over a copy of data/lore.txt, so its cache file lands in tmp_dir.
+
+    Args:
+        tmp_dir: Directory that owns the lore copy for this test
+
+    Returns:
+        FangenLoreManager for the copied lore file
+    """
+    lore_file = os.path.join(tmp_dir, "lore.txt")
+    shutil.copy(os.path.join(REPO_DIR, "data", "lore.txt"), lore_file)
+    return FangenLoreManager(lore_file)
+
+def callback_update(data: str, user_id: int = 1) -> SimpleNamespace:
+    """Build a button-press update with just the attributes the handlers use.
+
+    As for a real CallbackQuery update, update.message is None, so a handler
+    that tries to reply instead of editing fails with AttributeError.
+
+    Args:
+        data: The button's callback_data
+        user_id: Id of the user (and private chat) pressing the button
+
+    Returns:
+        Update-like object whose query.answer and query.edit_message_text are AsyncMocks
+    """
+    query = SimpleNamespace(
+        data=data,
+        message=SimpleNamespace(chat_id=user_id, message_id=next(_message_ids)),
+        answer=AsyncMock(),
+        edit_message_text=AsyncMock()
+    )
+    return SimpleNamespace(
+        callback_query=query,
+        message=None,
+        effective_user=SimpleNamespace(id=user_id),
+        effective_chat=SimpleNamespace(id=user_id)
+    )
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the write-behind LastActiveBatcher
+"""
+
+import tempfile
+import unittest
+from unittest import mock
+
+from tests.helpers import make_database
+from utils.batching import LastActiveBatcher
+
+OLD_TIMESTAMP = "2000-01-01 00:00:00"
+
+class LastActiveBatcherTest(unittest.IsolatedAsyncioTestCase):
+    """Checks that touches are buffered and written by flush()."""
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db = make_database(self._tmp.name)
+        for user_id in (1, 2):
+            self.db.execute_query(
+                "INSERT INTO users (user_id, last_active) VALUES (?, ?)", (user_id, OLD_TIMESTAMP)
+            )
+        # A long interval keeps the background task from writing on its own
+        self.batcher = LastActiveBatcher(self.db, interval=60, min_interval=60)
+
+    async def asyncTearDown(self):
+        self.db.close()
+        self._tmp.cleanup()
+
+    def last_active(self, user_id: int) -> str:
+        return self.db.execute_query("SELECT last_active FROM users WHERE user_id = ?", (user_id,))[0]["last_active"]
+
+    async def test_touch_is_buffered_until_flush(self):
+        self.batcher.touch(1)
+        self.batcher.touch(2)
+        self.assertEqual(self.last_active(1), OLD_TIMESTAMP)
+
+        await self.batcher.flush()
+
+        self.assertNotEqual(self.last_active(1), OLD_TIMESTAMP)
+        self.assertNotEqual(self.last_active(2), OLD_TIMESTAMP)
+
+    async def test_flush_writes_batch_in_one_call(self):
+        self.batcher.touch(1)
+        self.batcher.touch(2)
+
+        with mock.patch.object(self.db, "execute_many", wraps=self.db.execute_many) as execute_many:
+            await self.batcher.flush()
+
+        execute_many.assert_called_once()
+        self.assertEqual(sorted(user_id for _, user_id in execute_many.call_args.args[1]), [1, 2])
+
+    async def test_repeat_touches_within_min_interval_are_dropped(self):
+        self.batcher.touch(1)
+        self.batcher.touch(1)
+
+        self.assertEqual(self.batcher._queue.qsize(), 1)
+
+    async def test_touch_after_min_interval_is_queued(self):
+        batcher = LastActiveBatcher(self.db, interval=60, min_interval=0)
+        batcher.touch(1)
+        batcher.touch(1)
+
+        self.assertEqual(batcher._queue.qsize(), 2)
+
+    async def test_debounce_memory_is_bounded(self):
+        batcher = LastActiveBatcher(self.db, interval=60, min_interval=60, max_tracked=2)
+        for user_id in range(10):
+            batcher.touch(user_id)
+
+        self.assertEqual(len(batcher._recent), 2)
+
+    async def test_flush_with_nothing_queued_skips_database(self):
+        with mock.patch.object(self.db, "run_async") as run_async:
+            await self.batcher.flush()
+
+        run_async.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
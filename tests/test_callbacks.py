@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for callback routing in main.handle_callback
+"""
+
+import html
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import handlers.lore_handlers as lore_handlers_module
+from handlers.lore_handlers import LoreCommandHandlers
+from handlers.quest_handlers import QuestCommandHandlers
+from main import build_callback_routes, handle_callback
+from tests.helpers import callback_update, make_database, make_lore_manager
+from utils.batching import LastActiveBatcher
+from utils.concurrency import drain_edits
+from utils.quest_manager import QuestManager
+
+# Buttons routed to a handler that re-renders a command's screen
+RERENDER_BUTTONS = (
+    "main_menu", "quests_menu", "characters_menu", "inventory_menu", "lore_menu",
+    "quests_back", "view_collection", "status_back", "discover_more",
+    "toggle_notifications", "cycle_discovery_frequency", "cycle_theme"
+)
+
+class HandleCallbackTest(unittest.IsolatedAsyncioTestCase):
+    """Sends fake CallbackQuery updates through main.handle_callback."""
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db = make_database(self._tmp.name)
+        lore_manager = make_lore_manager(self._tmp.name)
+        quest_manager = QuestManager(self.db, lore_manager)
+        self.batcher = LastActiveBatcher(self.db)
+        self.lore_handlers = LoreCommandHandlers(lore_manager, self.db, self.batcher)
+        quest_handlers = QuestCommandHandlers(lore_manager, self.db, quest_manager, self.batcher)
+        self.context = SimpleNamespace(args=None, bot_data={
+            'db': self.db,
+            'lore_manager': lore_manager,
+            'quest_manager': quest_manager,
+            'last_active_batcher': self.batcher,
+            'lore_handlers': self.lore_handlers,
+            'quest_handlers': quest_handlers,
+            'callback_routes': build_callback_routes(quest_handlers, self.lore_handlers)
+        })
+
+    async def asyncTearDown(self):
+        await drain_edits()
+        await self.batcher.flush()
+        lore_handlers_module._pending_settings.clear()
+        self.db.close()
+        self._tmp.cleanup()
+
+    async def press(self, data: str):
+        """Route one button press and return its (mock) CallbackQuery."""
+        update = callback_update(data)
+        await handle_callback(update, self.context)
+        return update.callback_query
+
+    async def test_rerender_buttons_edit_the_message(self):
+        for data in RERENDER_BUTTONS:
+            with self.subTest(data=data):
+                query = await self.press(data)
+                query.answer.assert_awaited_once_with()
+                query.edit_message_text.assert_awaited_once()
+
+    async def test_settings_toggle_saves_and_refreshes_menu(self):
+        query = await self.press("toggle_notifications")
+
+        markup = query.edit_message_text.await_args.kwargs["reply_markup"]
+        self.assertEqual(markup.inline_keyboard[0][0].text, "Notifications: OFF")
+        settings = await self.lore_handlers._load_settings(1)
+        self.assertFalse(settings["notifications"])
+
+    async def test_quest_opcode_routes_to_quest_handlers(self):
+        quest_name = "The Ember's Awakening"
+        query = await self.press(f"qv|{quest_name}")
+
+        self.assertIn(html.escape(quest_name), query.edit_message_text.await_args.args[0])
+
+    async def test_lore_prefix_routes_to_lore_handlers(self):
+        query = await self.press("lore_cat_characters")
+
+        self.assertIn("Characters Lore Entries", query.edit_message_text.await_args.args[0])
+
+    async def test_collection_skips_names_outside_the_lore(self):
+        entry_name = next(iter(self.context.bot_data['lore_manager'].characters))
+        for item_name in (entry_name, "x" * 100):
+            self.db.execute_query(
+                "INSERT INTO user_progress (user_id, category, item_name, discovered) VALUES (1, 'characters', ?, TRUE)",
+                (item_name,)
+            )
+
+        query = await self.press("collection_cat_characters")
+
+        rows = query.edit_message_text.await_args.kwargs["reply_markup"].inline_keyboard
+        self.assertEqual([row[0].text for row in rows], [entry_name, "« Back to Collection"])
+        for row in rows:
+            self.assertLessEqual(len(row[0].callback_data.encode()), 64)
+
+    async def test_unknown_callback_is_answered(self):
+        query = await self.press("no_such_button")
+
+        query.answer.assert_awaited_once_with("Unknown callback data")
+        query.edit_message_text.assert_not_awaited()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for Database.transaction()
+"""
+
+import sqlite3
+import tempfile
+import unittest
+
+from tests.helpers import make_database
+
+SQL_ADD_USER = "INSERT INTO users (user_id, username) VALUES (?, ?)"
+SQL_USER_IDS = "SELECT user_id FROM users ORDER BY user_id"
+
+class TransactionTest(unittest.TestCase):
+    """Checks commit, rollback and nesting of transaction() blocks."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db = make_database(self._tmp.name)
+
+    def tearDown(self):
+        self.db.close()
+        self._tmp.cleanup()
+
+    def user_ids(self):
+        return [row["user_id"] for row in self.db.execute_query(SQL_USER_IDS)]
+
+    def test_block_commits_on_exit(self):
+        with self.db.transaction():
+            self.db.execute_query(SQL_ADD_USER, (1, "a"))
+            self.db.execute_many(SQL_ADD_USER, [(2, "b"), (3, "c")])
+            self.assertTrue(self.db.conn.in_transaction)
+
+        self.assertFalse(self.db.conn.in_transaction)
+        self.assertEqual(self.user_ids(), [1, 2, 3])
+
+    def test_nested_block_joins_outer_transaction(self):
+        with self.db.transaction():
+            self.db.execute_query(SQL_ADD_USER, (1, "a"))
+            with self.db.transaction():
+                self.db.execute_query(SQL_ADD_USER, (2, "b"))
+            # Leaving the inner block must not commit
+            self.assertTrue(self.db.conn.in_transaction)
+            self.assertEqual(self.db._tx_depth, 1)
+
+        self.assertEqual(self.db._tx_depth, 0)
+        self.assertEqual(self.user_ids(), [1, 2])
+
+    def test_exception_rolls_back_whole_block(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.execute_query(SQL_ADD_USER, (1, "a"))
+                with self.db.transaction():
+                    self.db.execute_query(SQL_ADD_USER, (2, "b"))
+                    raise RuntimeError("boom")
+
+        self.assertEqual(self.db._tx_depth, 0)
+        self.assertEqual(self.user_ids(), [])
+
+    def test_query_error_is_raised_and_rolls_back(self):
+        with self.assertRaises(sqlite3.IntegrityError):
+            with self.db.transaction():
+                self.db.execute_query(SQL_ADD_USER, (1, "a"))
+                self.db.execute_query(SQL_ADD_USER, (1, "duplicate"))
+
+        self.assertEqual(self.user_ids(), [])
+
+    def test_query_error_outside_transaction_returns_none(self):
+        self.db.execute_query(SQL_ADD_USER, (1, "a"))
+
+        self.assertIsNone(self.db.execute_query(SQL_ADD_USER, (1, "duplicate")))
+        self.assertFalse(self.db.execute_many(SQL_ADD_USER, [(2, "b"), (1, "duplicate")]))
+        self.assertEqual(self.user_ids(), [1])
+
+if __name__ == "__main__":
+    unittest.main()
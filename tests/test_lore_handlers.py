@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the lore command handlers
+"""
+
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+import handlers.lore_handlers as lore_handlers_module
+from handlers.lore_handlers import ENTRY_TOKEN_PREFIX, LoreCommandHandlers
+from tests.helpers import make_database, make_lore_manager
+from utils.batching import LastActiveBatcher
+
+class EntryTokenTest(unittest.TestCase):
+    """Round-trips entry names through the short lore_id_ callback tokens."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db = make_database(self._tmp.name)
+        self.lore_manager = make_lore_manager(self._tmp.name)
+        self.handlers = LoreCommandHandlers(self.lore_manager, self.db, LastActiveBatcher(self.db))
+
+    def tearDown(self):
+        self.db.close()
+        self._tmp.cleanup()
+
+    def test_every_entry_round_trips(self):
+        for entries in self.lore_manager.lore_data.values():
+            for entry_name in entries:
+                token = self.handlers._entry_callback(entry_name)
+                self.assertTrue(token.startswith(ENTRY_TOKEN_PREFIX))
+                self.assertLessEqual(len(token.encode()), 64)
+                self.assertEqual(self.handlers._decode_entry_token(token), f"lore_entry_{entry_name}")
+
+    def test_malformed_and_out_of_range_tokens_are_stale(self):
+        version = self.lore_manager.version
+        for token in (
+            f"{ENTRY_TOKEN_PREFIX}{version}_-1",
+            f"{ENTRY_TOKEN_PREFIX}{version}_999999",
+            f"{ENTRY_TOKEN_PREFIX}{version}_",
+            f"{ENTRY_TOKEN_PREFIX}{version}_x",
+            f"{ENTRY_TOKEN_PREFIX}-1",
+            f"{ENTRY_TOKEN_PREFIX}0",
+            ENTRY_TOKEN_PREFIX
+        ):
+            with self.subTest(token=token):
+                self.assertEqual(self.handlers._decode_entry_token(token), "lore_back")
+
+    def test_token_from_before_reload_is_stale(self):
+        entry_name = next(iter(self.lore_manager.characters))
+        token = self.handlers._entry_callback(entry_name)
+
+        self.lore_manager.load_lore()
+
+        self.assertEqual(self.handlers._decode_entry_token(token), "lore_back")
+        fresh = self.handlers._entry_callback(entry_name)
+        self.assertEqual(self.handlers._decode_entry_token(fresh), f"lore_entry_{entry_name}")
+
+    def test_names_outside_the_lore_get_no_button(self):
+        entry_name = next(iter(self.lore_manager.characters))
+        typed_name = "x" * 100
+
+        self.assertIsNone(self.handlers._entry_callback(typed_name))
+        buttons = self.handlers._entry_buttons([typed_name, entry_name], prefix="👤 ")
+        self.assertEqual([button.text for button in buttons], [f"👤 {entry_name}"])
+
+class PendingSettingsTest(unittest.IsolatedAsyncioTestCase):
+    """Checks the write-behind settings buffer."""
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db = make_database(self._tmp.name)
+        self.db.execute_query("INSERT INTO users (user_id) VALUES (?)", (1,))
+        self.handlers = LoreCommandHandlers(make_lore_manager(self._tmp.name), self.db, LastActiveBatcher(self.db))
+
+    async def asyncTearDown(self):
+        lore_handlers_module._pending_settings.clear()
+        self.db.close()
+        self._tmp.cleanup()
+
+    def stored_settings(self, user_id: int):
+        settings = self.db.execute_query("SELECT settings FROM users WHERE user_id = ?", (user_id,))[0]["settings"]
+        return settings and json.loads(settings)
+
+    async def test_saved_settings_are_buffered_until_flush(self):
+        settings = await self.handlers._load_settings(1)
+        settings["theme"] = "dark"
+        self.handlers._save_settings(1, settings)
+
+        self.assertIsNone(self.stored_settings(1))
+        self.assertEqual((await self.handlers._load_settings(1))["theme"], "dark")
+
+        await self.handlers.flush_pending_writes()
+
+        self.assertEqual(self.stored_settings(1)["theme"], "dark")
+        self.assertEqual(lore_handlers_module._pending_settings, {})
+
+    async def test_failed_flush_keeps_buffer(self):
+        settings = await self.handlers._load_settings(1)
+        self.handlers._save_settings(1, settings)
+
+        with mock.patch.object(self.db, "execute_many", return_value=False):
+            await self.handlers.flush_pending_writes()
+
+        self.assertIn(1, lore_handlers_module._pending_settings)
+        await self.handlers.flush_pending_writes()
+        self.assertEqual(lore_handlers_module._pending_settings, {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the /start command in main.py
+"""
+
+import asyncio
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from unittest.mock import AsyncMock
+
+import main
+from tests.helpers import make_database
+from utils.batching import LastActiveBatcher
+
+class StartCommandTest(unittest.IsolatedAsyncioTestCase):
+    """Checks that /start only remembers users whose registration was written."""
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db = make_database(self._tmp.name)
+        self.batcher = LastActiveBatcher(self.db, interval=60)
+        self.tasks = []
+        application = SimpleNamespace(
+            create_task=lambda coro, update=None: self.tasks.append(asyncio.create_task(coro))
+        )
+        self.context = SimpleNamespace(
+            application=application,
+            bot_data={'db': self.db, 'last_active_batcher': self.batcher}
+        )
+        main._recent_users.clear()
+
+    async def asyncTearDown(self):
+        main._recent_users.clear()
+        self.db.close()
+        self._tmp.cleanup()
+
+    async def start(self, user_id: int = 1) -> None:
+        """Send /start and wait for the background registration."""
+        user = SimpleNamespace(
+            id=user_id, username="user", first_name="First", last_name="Last",
+            mention_html=lambda: "<a>user</a>"
+        )
+        update = SimpleNamespace(effective_user=user, message=SimpleNamespace(reply_text=AsyncMock()))
+        await main.start_command(update, self.context)
+        await asyncio.gather(*self.tasks)
+        self.tasks.clear()
+
+    async def test_successful_registration_is_remembered(self):
+        await self.start()
+
+        rows = self.db.execute_query("SELECT first_name FROM users WHERE user_id = ?", (1,))
+        self.assertEqual(rows, [{"first_name": "First"}])
+        self.assertTrue(main._recent_users.get(1))
+
+    async def test_failed_registration_is_retried_on_next_start(self):
+        with mock.patch.object(self.db, "execute_many", return_value=False):
+            await self.start()
+
+        self.assertIsNone(main._recent_users.get(1))
+
+        await self.start()
+
+        self.assertEqual(len(self.db.execute_query("SELECT user_id FROM users WHERE user_id = ?", (1,))), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Write-behind batching for frequent, low-value database updates
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+from utils.cache import LRUCache
+from utils.logger import get_logger
+from utils.database import Database
+from config import LAST_ACTIVE_CACHE_SIZE, LAST_ACTIVE_FLUSH_INTERVAL, LAST_ACTIVE_MIN_INTERVAL
+
+logger = get_logger(__name__)
+
+SQL_TOUCH_USER = "UPDATE users SET last_active = ? WHERE user_id = ?"
+
+class LastActiveBatcher:
+    """Coalesces users.last_active updates and writes them in batches.
+    
+    One instance is shared by all handlers. They call touch(), which only
+    enqueues the user id. A background task waits up to `interval` seconds
+    after the first touch, drains the queue, keeps the latest timestamp per
+    user and writes them all in one transaction.
+    Touches for a user within `min_interval` seconds of their last queued one
+    are dropped, since last_active doesn't need second-level accuracy. Queued
+    touches are remembered in a bounded LRUCache that expires them after
+    `min_interval`, so the debounce doesn't grow with every user ever seen.
+    """
+    
+    def __init__(self, db: Database, interval: float = LAST_ACTIVE_FLUSH_INTERVAL, max_batch: int = 1000,
+                 min_interval: float = LAST_ACTIVE_MIN_INTERVAL, max_tracked: int = LAST_ACTIVE_CACHE_SIZE):
+        """Initialize the batcher.
+        
+        Args:
+            db: Database instance to write to
+            interval: Seconds to collect touches before writing
+            max_batch: Maximum queued touches drained into one write
+            min_interval: Seconds to ignore further touches for a user
+            max_tracked: Maximum users remembered for debouncing
+        """
+        self.db = db
+        self.interval = interval
+        self.max_batch = max_batch
+        self.min_interval = min_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._batch: Dict[int, float] = {}  # user_id -> latest activity (epoch seconds)
+        self._task: Optional[asyncio.Task] = None
+        # Users touched within the last min_interval seconds
+        self._recent = LRUCache(maxsize=max_tracked, ttl=min_interval)
+    
+    def touch(self, user_id: int) -> None:
+        """Record activity for a user without waiting on the database."""
+        if self._recent.get(user_id):
+            return
+        self._recent.set(user_id, True)
+        self._queue.put_nowait((user_id, time.time()))
+        # Started lazily because handlers are built before the event loop runs
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def flush(self) -> None:
+        """Write everything queued so far, e.g. before shutdown."""
+        self._drain()
+        await self._write_batch()
+    
+    def _drain(self) -> None:
+        """Move up to max_batch queued touches into the pending batch."""
+        for _ in range(self.max_batch):
+            try:
+                user_id, ts = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            self._batch[user_id] = ts
+    
+    async def _run(self) -> None:
+        """Background loop: wait for a touch, let more arrive, then write."""
+        while True:
+            user_id, ts = await self._queue.get()
+            self._batch[user_id] = ts
+            await asyncio.sleep(self.interval)
+            self._drain()
+            try:
+                await self._write_batch()
+            except Exception as e:
+                logger.error(f"Error writing last_active batch: {e}", exc_info=True)
+    
+    async def _write_batch(self) -> None:
+        """Write and clear the pending batch."""
+        batch, self._batch = self._batch, {}
+        if not batch:
+            return
+        
+        params = [(time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts)), user_id) for user_id, ts in batch.items()]
+        await self.db.run_async(self._write, params)
+    
+    def _write(self, params) -> None:
+        """Run the batched UPDATE in one transaction (worker thread)."""
+        with self.db.transaction():
+            self.db.execute_many(SQL_TOUCH_USER, params)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Concurrency helpers for ChuzoBot handlers
+"""
+
+import asyncio
+import contextvars
+import functools
+from typing import Dict, Hashable, Set, Tuple
+from weakref import WeakValueDictionary
+
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import BaseUpdateProcessor
+
+from utils.logger import get_logger
+from config import TELEGRAM_MAX_RETRIES, EDIT_MIN_INTERVAL
+
+logger = get_logger(__name__)
+
+# Set while a bounded handler runs, so handlers that call each other
+# (e.g. a callback re-rendering a command) do not take a second slot
+_in_bounded_handler = contextvars.ContextVar("in_bounded_handler", default=False)
+
+def bounded(func):
+    """Run a handler method while holding a slot of its instance's `_sem` semaphore.
+    
+    Nested calls from inside another bounded handler reuse the outer slot.
+    
+    Args:
+        func: Async handler method of an object with a `_sem` attribute
+    
+    Returns:
+        Wrapped handler method
+    """
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        if _in_bounded_handler.get():
+            return await func(self, *args, **kwargs)
+        
+        async with self._sem:
+            token = _in_bounded_handler.set(True)
+            try:
+                return await func(self, *args, **kwargs)
+            finally:
+                _in_bounded_handler.reset(token)
+    
+    return wrapper
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates from different chats concurrently, one at a time per chat.
+    
+    An update first waits for its chat's lock and only then for one of the
+    `max_concurrent_updates` global slots, so a chat with a backlog doesn't
+    hold slots that other chats could use.
+    """
+    
+    def __init__(self, max_concurrent_updates: int):
+        """Initialize the processor.
+        
+        Args:
+            max_concurrent_updates: Maximum updates processed at once overall
+        """
+        super().__init__(max_concurrent_updates)
+        # Locks disappear once no update of that chat holds or waits on them
+        self._chat_locks: WeakValueDictionary = WeakValueDictionary()
+    
+    async def process_update(self, update: object, coroutine) -> None:
+        """Run the update's handlers under its chat lock and a global slot."""
+        chat = getattr(update, "effective_chat", None)
+        if chat is None:
+            await super().process_update(update, coroutine)
+            return
+        
+        lock = self._chat_locks.get(chat.id)
+        if lock is None:
+            lock = self._chat_locks[chat.id] = asyncio.Lock()
+        async with lock:
+            await super().process_update(update, coroutine)
+    
+    async def do_process_update(self, update: object, coroutine) -> None:
+        """Await the update's handlers."""
+        await coroutine
+    
+    async def initialize(self) -> None:
+        """Nothing to set up."""
+    
+    async def shutdown(self) -> None:
+        """Nothing to tear down."""
+
+async def send_with_retry(method, *args, **kwargs):
+    """Call a Telegram API method, waiting and retrying when rate limited.
+    
+    Only RetryAfter (HTTP 429) is retried: Telegram rejected the request, so
+    resending it cannot duplicate a message. The wait is the server-provided
+    delay or an exponential backoff, whichever is longer.
+    
+    Args:
+        method: Bound Telegram API coroutine method, e.g. message.reply_text
+        *args: Positional arguments for the method
+        **kwargs: Keyword arguments for the method
+    
+    Returns:
+        Result of the API call
+    """
+    for attempt in range(TELEGRAM_MAX_RETRIES + 1):
+        try:
+            return await method(*args, **kwargs)
+        except RetryAfter as e:
+            if attempt == TELEGRAM_MAX_RETRIES:
+                raise
+            delay = max(float(e.retry_after), 2 ** attempt)
+            logger.warning(f"Rate limited by Telegram, retrying in {delay:.0f}s (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+
+
+class EditCoalescer:
+    """Spaces out edits of the same message and drops superseded ones.
+    
+    The first edit of a message goes out immediately. Edits submitted for that
+    message within `min_interval` seconds are held, and only the latest one is
+    sent once the interval has passed, so button mashing costs one API call per
+    interval instead of one per click.
+    """
+    
+    def __init__(self, min_interval: float = EDIT_MIN_INTERVAL):
+        """Initialize the coalescer.
+        
+        Args:
+            min_interval: Minimum seconds between edits of one message
+        """
+        self.min_interval = min_interval
+        self._cooling: Set[Hashable] = set()
+        self._pending: Dict[Hashable, Tuple] = {}  # key -> latest (method, args, kwargs)
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def submit(self, key: Hashable, method, *args, **kwargs) -> None:
+        """Edit now, or queue the edit if `key` was edited within the interval.
+        
+        Args:
+            key: Identifies the message, e.g. (chat_id, message_id)
+            method: Bound edit coroutine method, e.g. query.edit_message_text
+            *args: Positional arguments for the method
+            **kwargs: Keyword arguments for the method
+        """
+        if key in self._cooling:
+            self._pending[key] = (method, args, kwargs)
+            return
+        
+        self._cooling.add(key)
+        try:
+            await send_with_retry(method, *args, **kwargs)
+        finally:
+            task = asyncio.get_running_loop().create_task(self._cool_down(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _cool_down(self, key: Hashable) -> None:
+        """Send the latest queued edit after each interval until none is left."""
+        try:
+            while True:
+                await asyncio.sleep(self.min_interval)
+                pending = self._pending.pop(key, None)
+                if pending is None:
+                    return
+                method, args, kwargs = pending
+                try:
+                    await send_with_retry(method, *args, **kwargs)
+                except TelegramError as e:
+                    logger.warning(f"Coalesced edit for {key} failed: {e}")
+        finally:
+            self._cooling.discard(key)
+    
+    async def drain(self) -> None:
+        """Wait for queued edits to be sent, e.g. before shutdown."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+_edit_coalescer = EditCoalescer()
+
+async def edit_message(query, *args, **kwargs) -> None:
+    """Edit a callback query's message through the shared EditCoalescer.
+    
+    Args:
+        query: The CallbackQuery whose message is edited
+        *args: Positional arguments for edit_message_text
+        **kwargs: Keyword arguments for edit_message_text
+    """
+    message = query.message
+    if message is None:
+        # Inline-mode messages carry no chat/message ids to key on
+        await send_with_retry(query.edit_message_text, *args, **kwargs)
+        return
+    await _edit_coalescer.submit((message.chat_id, message.message_id), query.edit_message_text, *args, **kwargs)
+
+async def reply_or_edit(update, *args, **kwargs) -> None:
+    """Answer a command with a new message, or a button press by editing its message.
+    
+    Lets a command handler also serve the callback buttons that re-render its
+    screen; on a CallbackQuery update, update.message is None.
+    
+    Args:
+        update: The update being handled
+        *args: Positional arguments for reply_text / edit_message_text
+        **kwargs: Keyword arguments for reply_text / edit_message_text
+    """
+    if update.callback_query is not None:
+        await edit_message(update.callback_query, *args, **kwargs)
+    else:
+        await send_with_retry(update.message.reply_text, *args, **kwargs)
+
+async def drain_edits() -> None:
+    """Wait for edits still held by the shared EditCoalescer."""
+    await _edit_coalescer.drain()
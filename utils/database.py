@@ -6,16 +6,22 @@ Enhanced database utility for ChuzoBot
 Supporting quests, inventory, and character interactions
 """
 
+import asyncio
 import os
 import sqlite3
 import json
+import threading
+from contextlib import contextmanager
 from typing import Dict, List, Tuple, Any, Optional
 
 from utils.logger import get_logger
-from config import DB_TYPE, DB_NAME, DB_HOST, DB_PORT, DB_USER, DB_PASSWORD
+from config import DB_TYPE, DB_NAME, DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_BUSY_TIMEOUT
 
 logger = get_logger(__name__)
 
+# Number of prepared statements the SQLite connection keeps, keyed by SQL text
+STATEMENT_CACHE_SIZE = 256
+
 class Database:
     """Database handler for ChuzoBot."""
     
@@ -28,6 +34,10 @@ class Database:
         self.conn = None
         self.db_type = DB_TYPE
         self.db_name = DB_NAME
+        # Serializes access to the shared connection across worker threads
+        self._lock = threading.RLock()
+        # Nesting depth of transaction() blocks held by the lock owner
+        self._tx_depth = 0
         
         if self.db_type == "sqlite":
             self._connect_sqlite()
@@ -43,8 +53,18 @@ class Database:
             os.makedirs('data', exist_ok=True)
             
             db_path = os.path.join('data', self.db_name)
-            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn = sqlite3.connect(
+                db_path,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
             self.conn.row_factory = sqlite3.Row
+            
+            # WAL lets readers proceed during writes; NORMAL sync is safe in WAL mode
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            # Wait for another process's write lock instead of failing with "database is locked"
+            self.conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT:d}")
             logger.info(f"Connected to SQLite database: {db_path}")
         except Exception as e:
             logger.error(f"Error connecting to SQLite database: {e}", exc_info=True)
@@ -117,6 +137,16 @@ class Database:
                 )
             ''')
             
+            # Covering indexes for per-user discovery lookups (status, collection, discover)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_up_user_disc "
+                "ON user_progress (user_id, discovered, category, item_name)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_up_user_cat "
+                "ON user_progress (user_id, category, discovered, item_name)"
+            )
+            
             # Create user_inventory table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS user_inventory (
@@ -254,6 +284,42 @@ class Database:
         except Exception as e:
             logger.error(f"Error adding initial recipes: {e}", exc_info=True)
     
+    @contextmanager
+    def transaction(self):
+        """Run several queries as a single atomic transaction.
+        
+        Holds the connection lock for the whole block and, on SQLite, takes
+        the write lock up front with BEGIN IMMEDIATE. Queries executed inside
+        the block are committed together on exit, or rolled back together if
+        the block raises. Query errors inside a transaction are re-raised
+        instead of being swallowed. Nested blocks join the outer transaction.
+        
+        Example:
+            with db.transaction():
+                db.execute_query(...)
+                db.execute_query(...)
+        """
+        with self._lock:
+            if self._tx_depth:
+                self._tx_depth += 1
+                try:
+                    yield
+                finally:
+                    self._tx_depth -= 1
+                return
+            
+            if self.db_type == "sqlite":
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._tx_depth = 1
+            try:
+                yield
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            finally:
+                self._tx_depth = 0
+    
     def execute_query(self, query: str, params: Tuple = ()) -> Optional[List[Dict]]:
         """Execute a database query.
         
@@ -270,36 +336,164 @@ class Database:
             return None
         
         cursor = None
-        try:
-            # Use a lock to prevent race conditions in concurrent access
-            cursor = self.conn.cursor()
-            cursor.execute(query, params)
-            
-            if query.strip().upper().startswith(("SELECT", "PRAGMA")):
-                if self.db_type == "sqlite":
-                    results = [dict(row) for row in cursor.fetchall()]
+        # Use a lock to prevent race conditions in concurrent access
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute(query, params)
+                
+                if query.strip().upper().startswith(("SELECT", "PRAGMA")):
+                    if self.db_type == "sqlite":
+                        results = [dict(row) for row in cursor.fetchall()]
+                    else:
+                        results = cursor.fetchall()
+                    return results
                 else:
-                    results = cursor.fetchall()
-                return results
-            else:
-                self.conn.commit()
+                    # Inside transaction() the commit happens when the block exits
+                    if not self._tx_depth:
+                        self.conn.commit()
+                    return None
+            except sqlite3.Error as e:
+                logger.error(f"SQLite error executing query: {e}", exc_info=True)
+                # Let transaction() roll back the whole block
+                if self._tx_depth:
+                    raise
+                # Rollback transaction on error
+                if self.conn:
+                    self.conn.rollback()
                 return None
-        except sqlite3.Error as e:
-            logger.error(f"SQLite error executing query: {e}", exc_info=True)
-            # Rollback transaction on error
-            if self.conn:
-                self.conn.rollback()
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error executing query: {e}", exc_info=True)
-            # Rollback transaction on error
-            if self.conn:
-                self.conn.rollback()
-            return None
-        finally:
-            # Close cursor if it was created
-            if cursor:
-                cursor.close()
+            except Exception as e:
+                logger.error(f"Unexpected error executing query: {e}", exc_info=True)
+                if self._tx_depth:
+                    raise
+                # Rollback transaction on error
+                if self.conn:
+                    self.conn.rollback()
+                return None
+            finally:
+                # Close cursor if it was created
+                if cursor:
+                    cursor.close()
+    
+    async def run_async(self, func, *args):
+        """Run a blocking database function on a worker thread.
+        
+        Handlers move all of their database work off the event loop through
+        this method or execute_query_async, so it shares asyncio's default
+        thread pool and needs no shutdown of its own.
+        
+        Args:
+            func: Callable that uses this database, e.g. self.execute_query
+            *args: Positional arguments for func
+            
+        Returns:
+            The result of func
+        """
+        return await asyncio.to_thread(func, *args)
+    
+    async def execute_query_async(self, query: str, params: Tuple = ()) -> Optional[List[Dict]]:
+        """Execute a database query on a worker thread so the event loop isn't blocked.
+        
+        Args:
+            query: SQL query string to execute
+            params: Parameters to bind to the query
+            
+        Returns:
+            The result of execute_query
+        """
+        return await self.run_async(self.execute_query, query, params)
+    
+    def execute_many(self, query: str, params_list: List[Tuple]) -> bool:
+        """Execute a write query for each parameter tuple in a single transaction.
+        
+        Args:
+            query: SQL query string to execute
+            params_list: Sequence of parameter tuples to bind to the query
+            
+        Returns:
+            True if all rows were written and committed, False otherwise
+        """
+        if not self.conn:
+            logger.error("Database connection not established")
+            return False
+        
+        cursor = None
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.executemany(query, params_list)
+                if not self._tx_depth:
+                    self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"Error executing batch query: {e}", exc_info=True)
+                if self._tx_depth:
+                    raise
+                # Rollback transaction on error
+                if self.conn:
+                    self.conn.rollback()
+                return False
+            finally:
+                if cursor:
+                    cursor.close()
+    
+    def load_lore_entries(self, entries: List[Tuple[str, str]]) -> bool:
+        """Load the lore entry catalogue into temporary tables.
+        
+        Fills lore_entries with every known entry and lore_totals with the
+        entry count per category (in first-seen order), so queries can compare
+        user progress against the lore in SQL instead of in Python. The tables
+        only live for this connection, so they are rebuilt whenever the lore
+        is (re)loaded.
+        
+        Args:
+            entries: List of (category, item_name) tuples
+            
+        Returns:
+            True if the table was populated, False otherwise
+        """
+        if not self.conn:
+            logger.error("Database connection not established")
+            return False
+        
+        cursor = None
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute('''
+                    CREATE TEMP TABLE IF NOT EXISTS lore_entries (
+                        category TEXT,
+                        item_name TEXT,
+                        PRIMARY KEY (category, item_name)
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE TEMP TABLE IF NOT EXISTS lore_totals (
+                        category TEXT PRIMARY KEY,
+                        total INTEGER,
+                        position INTEGER
+                    )
+                ''')
+                cursor.execute("DELETE FROM lore_entries")
+                cursor.execute("DELETE FROM lore_totals")
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO lore_entries (category, item_name) VALUES (?, ?)",
+                    entries
+                )
+                cursor.execute(
+                    "INSERT INTO lore_totals (category, total, position) "
+                    "SELECT category, COUNT(*), MIN(rowid) FROM lore_entries GROUP BY category"
+                )
+                self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"Error loading lore entries: {e}", exc_info=True)
+                if self.conn:
+                    self.conn.rollback()
+                return False
+            finally:
+                if cursor:
+                    cursor.close()
     
     def close(self):
         """Close the database connection.
@@ -362,7 +556,7 @@ class Database:
         for quest_name, scene_choices in quest_requirements.items():
             # Check if quest is completed
             quest_completed = self.execute_query(
-                "SELECT * FROM user_progress WHERE user_id = ? AND category = 'quests' AND item_name = ? AND discovered = TRUE",
+                "SELECT 1 FROM user_progress WHERE user_id = ? AND category = 'quests' AND item_name = ? AND discovered = TRUE LIMIT 1",
                 (user_id, quest_name)
             )
             
@@ -399,35 +593,37 @@ class Database:
             return False, message
         
         try:
-            # Consume required items
-            recipe = details["recipe"]
-            requirements = json.loads(recipe["requirements"])
-            
-            for req_item, req_quantity in requirements.items():
-                self.execute_query(
-                    "UPDATE user_inventory SET quantity = quantity - ? WHERE user_id = ? AND item_name = ?",
-                    (req_quantity, user_id, req_item)
-                )
-            
-            # Add crafted item
-            result_rarity = recipe["result_rarity"]
-            
-            # Check if item already exists in inventory
-            existing_item = self.execute_query(
-                "SELECT * FROM user_inventory WHERE user_id = ? AND item_name = ?",
-                (user_id, item_name)
-            )
-            
-            if existing_item:
-                self.execute_query(
-                    "UPDATE user_inventory SET quantity = quantity + 1 WHERE user_id = ? AND item_name = ?",
+            # Consume components and add the result atomically
+            with self.transaction():
+                # Consume required items
+                recipe = details["recipe"]
+                requirements = json.loads(recipe["requirements"])
+                
+                for req_item, req_quantity in requirements.items():
+                    self.execute_query(
+                        "UPDATE user_inventory SET quantity = quantity - ? WHERE user_id = ? AND item_name = ?",
+                        (req_quantity, user_id, req_item)
+                    )
+                
+                # Add crafted item
+                result_rarity = recipe["result_rarity"]
+                
+                # Check if item already exists in inventory
+                existing_item = self.execute_query(
+                    "SELECT * FROM user_inventory WHERE user_id = ? AND item_name = ?",
                     (user_id, item_name)
                 )
-            else:
-                self.execute_query(
-                    "INSERT INTO user_inventory (user_id, item_name, rarity, quantity) VALUES (?, ?, ?, 1)",
-                    (user_id, item_name, result_rarity)
-                )
+                
+                if existing_item:
+                    self.execute_query(
+                        "UPDATE user_inventory SET quantity = quantity + 1 WHERE user_id = ? AND item_name = ?",
+                        (user_id, item_name)
+                    )
+                else:
+                    self.execute_query(
+                        "INSERT INTO user_inventory (user_id, item_name, rarity, quantity) VALUES (?, ?, ?, 1)",
+                        (user_id, item_name, result_rarity)
+                    )
             
             return True, f"Successfully crafted {item_name} ({result_rarity})!"
         except Exception as e:
@@ -6,23 +6,144 @@ Fangen Lore Manager for ChuzoBot
 Handles loading, parsing, and retrieving the rich world of Fangen
 """
 
+import html
+import json
 import os
 import re
-import json
+import threading
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple, Any
 
+from utils.cache import LRUCache
 from utils.logger import get_logger
-from config import LORE_FILE
+from config import LORE_FILE, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
 
 logger = get_logger(__name__)
 
+try:
+    # Drop-in replacement for re with possessive quantifiers on every Python version
+    import regex as _rx
+except ImportError:
+    # re supports them natively from Python 3.11
+    _rx = re
+
+try:
+    # Optional linear-time engine (google-re2)
+    import re2
+except ImportError:
+    re2 = None
+
+try:
+    # Optional multi-pattern matcher (pyahocorasick) for finding character mentions
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Below this many characters one `in` test per name beats an automaton pass
+AUTOMATON_MIN_CHARACTERS = 48
+
+# Bump when the parser's output changes so cached lore from older code is reparsed
+LORE_CACHE_FORMAT = 1
+
+def _compile(pattern: str, flags: int = 0):
+    """Compile a lore pattern with RE2 when it is installed, otherwise with _rx.
+    
+    RE2 never backtracks, so the possessive quantifiers below (which only cut
+    backtracking that could not match) are plain greedy ones there. Patterns
+    RE2 can't compile fall back to _rx.
+    
+    Args:
+        pattern: Regular expression in re syntax
+        flags: re flags; only re.DOTALL is used by the lore patterns
+        
+    Returns:
+        A compiled pattern with the re search/findall/finditer interface
+    """
+    if re2 is not None:
+        options = re2.Options()
+        options.dot_nl = bool(flags & re.DOTALL)
+        options.log_errors = False
+        try:
+            return re2.compile(pattern.replace("++", "+").replace("*+", "*"), options)
+        except re2.error:
+            pass
+    return _rx.compile(pattern, flags)
+
+# Lore parsing patterns, compiled once at import. Possessive quantifiers (++, *+)
+# are used wherever the next token can't match what they consumed, so giving
+# characters back could never produce a match; on long runs of prose that would
+# otherwise be retried one character at a time, they fail immediately instead.
+_CHAR_RE = _compile(r'([A-Z](?:[A-Za-z, ]*[A-Za-z,])?) *\n•\s*+Backstory\s*+&?\s*+Role:\s*+(.*?)\s*•\s*+Personality\s*+&?\s*+Motivations:\s*+(.*?)\s*(?:•\s*+Item\s*+&?\s*+Quest Connections:|•\s*+Relationships:)', re.DOTALL)
+_ITEM_QUEST_RE = _compile(r'•\s*Item\s*&?\s*Quest Connections:(.*?)(?:_{10,}|$)', re.DOTALL)
+_POTENTIAL_ITEMS_RE = _compile(r'•\s*Potential Items:(.*?)(?:•\s*Quests:|$)', re.DOTALL)
+_CHAR_QUESTS_RE = _compile(r'•\s*Quests:(.*?)(?:$)', re.DOTALL)
+_EXPANDED_CHAR_RE = _compile(r'([A-Za-z, ]++)\n•\s*+Role:\s*+(.*?)•\s*+Backstory:\s*+(.*?)•\s*+Personality:\s*+(.*?)•\s*+Relationships:\s*+(.*?)•\s*+Significance in Lore:\s*+(.*?)(?:_{10,}|$)', re.DOTALL)
+_WORLD_RE = _compile(r'The World of Fangen\n•\s*Overview:\s*(.*?)(?:Key Historical Events|\n\n)', re.DOTALL)
+_EVENTS_RE = _compile(r'Key Historical Events\n(•\s*[^•]+)', re.DOTALL)
+_THEMES_RE = _compile(r'Elemental and Mystical Themes\n(•\s*[^•]+)', re.DOTALL)
+_CULTURE_RE = _compile(r'Cultural and Social Dynamics\n(•\s*[^•]+)', re.DOTALL)
+# "• Name: description" bullets, shared by events, themes, factions, item tiers and quest themes.
+# Both groups start and end on a non-space character, so captures come back already trimmed.
+_BULLET_KV_RE = _compile(r'•\s*+([^:\s](?:[^:]*[^:\s])?)\s*+:\s*+([^•\s](?:[^•]*[^•\s])?)', re.DOTALL)
+_ITEM_SECTION_RE = _compile(r'Item Crafting & Evolution:\s*(.*?)(?:\d\.\s*Quest Narratives:|$)', re.DOTALL)
+# Named items picked out of the lore text; each mention runs on to the next comma or period
+_ITEM_NAMES = (
+    "Ape's Wrath", "Wagami's Catalyst", "Shokei's Maw", "Moon Blade", "Seigo's Rampart",
+    "Miyou's Insight Amulet", "Kagitada's Lock", "Paper's Edge", "Paper Reaver",
+    "Alpha Empress's Sigil", "Voidforged Relic", "Inferno Fang", "Emberdust Vial", "Solar Fang"
+)
+# A literal alternation: re narrows candidates by first character before trying
+# names, which benchmarks faster than an Aho-Corasick pass plus Python per hit
+_ITEM_EXAMPLES_RE = _compile(rf'((?:{"|".join(map(re.escape, _ITEM_NAMES))})[^,.]*)')
+_QUEST_SECTION_RE = _compile(r'Quest Narratives:\s*(.*?)(?:\d\.\s*|$)', re.DOTALL)
+_QUEST_TITLE_RE = _compile(r'Quest: ([^\n]+)')
+_SCENE_SETTING_RE = _compile(r'Setting:\s*(.*?)(?:[A-Z][a-z]+\s*:|$)', re.DOTALL)
+_NPC_RE = _compile(r'([A-Za-z, ]++)(?:\(.*?\))?:\s*+"([^"]++)"', re.DOTALL)
+_CHOICE_RE = _compile(r'•\s*+Option\s*+(\d++[A-Z]?):\s*([^\n]+)(?:\nPlayer:\s*"([^"]+)")?\s*Outcome:(.*?)(?:•\s*Option\s*\d+[A-Z]?:|$)', re.DOTALL)
+_INV_RE = _compile(r'\[INV_UPDATE: ([^\]]++)\]', re.DOTALL)
+_WORD_RE = re.compile(r'([a-z]+)')
+# Personality words that pick a get_character_dialogue style, checked in this order
+_PLAYFUL_TRAITS = frozenset(("playful", "quirky", "eccentric"))
+_STOIC_TRAITS = frozenset(("stoic", "cold", "methodical"))
+_ARROGANT_TRAITS = frozenset(("arrogant", "cunning"))
+_FIERCE_TRAITS = frozenset(("fierce", "protective", "loyal"))
+# Lines that end a top-level lore section and start the next one
+_HEADING_RE = re.compile(
+    r'(?:The World of Fangen|Key Historical Events|Elemental and Mystical Themes|'
+    r'Cultural and Social Dynamics|Item Crafting & Evolution:|Quest Narratives:|Quest: .+)$',
+    re.MULTILINE
+)
+
+@lru_cache(maxsize=128)
+def _quest_desc_re(quest_title: str):
+    """Pattern for the description following "Quest: <title>"."""
+    return _compile(rf'Quest: {re.escape(quest_title)}(.*?)(?:Scene \d+:|$)', re.DOTALL)
+
+@lru_cache(maxsize=128)
+def _scene_re(quest_title: str):
+    """Pattern for the scenes of the quest titled quest_title."""
+    return _compile(
+        rf'Quest:\s*{re.escape(quest_title)}.*?Scene\s*+(\d++):\s*([^\n]++)(.*?)(?:Scene\s*+\d++:|Your\s*+Choice:|Epilogue:|$)',
+        re.DOTALL
+    )
+
+def _entry_text(content: Any) -> str:
+    """Join the strings in an entry, nested scenes and dialogues included."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict):
+        return "\n".join(_entry_text(value) for value in content.values())
+    if isinstance(content, (list, tuple)):
+        return "\n".join(_entry_text(value) for value in content)
+    return ""
+
 class FangenLoreManager:
     """Manages lore content for the Fangen universe."""
     
     def __init__(self, lore_file: str = LORE_FILE):
         """Initialize the LoreManager."""
         self.lore_file = lore_file
-        self.lore_data = {
+        self._lore_data = {
             "world": {},
             "events": {},
             "themes": {},
@@ -32,41 +153,255 @@ class FangenLoreManager:
             "items": {},
             "quests": {}
         }
-        self.characters = []
-        self.items = []
-        self.quests = []
-        self.load_lore()
+        self._characters = []
+        self._items = []
+        self._quests = []
+        # Bumped on every (re)load so callers can invalidate derived caches
+        self._version = 0
+        # entry_name -> (category, content), and memoized (category, content, related) bundles
+        self._entry_index: Dict[str, Tuple[str, Any]] = {}
+        self._entry_bundles: Dict[str, Tuple[str, Any, List[str]]] = {}
+        # entry_name -> Telegram HTML text for free-text lookups, built on first use
+        self._formatted_entries: Dict[str, str] = {}
+        # Search results keyed by normalized query, cleared on every load
+        self._search_cache = LRUCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+        # category -> [(entry name, lowercased searchable text)], rebuilt on every load
+        self._lower_index: Dict[str, List[Tuple[str, str]]] = {}
+        # character name -> words in their personality, rebuilt on every load
+        self._character_traits: Dict[str, frozenset] = {}
+        # Aho-Corasick automaton over self._characters, rebuilt on every load
+        self._char_automaton = None
+        # heading -> text from that heading to the next, only while a file is parsed
+        self._sections: Dict[str, str] = {}
+        # The file is parsed on first use rather than here; see _ensure_loaded
+        self._loaded = False
+        self._load_lock = threading.RLock()
+    
+    def _ensure_loaded(self) -> None:
+        """Parse the lore file the first time any lore is asked for."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self.load_lore()
+    
+    @property
+    def lore_data(self) -> Dict[str, Dict[str, Any]]:
+        """Parsed lore by category, loading the file on first access."""
+        self._ensure_loaded()
+        return self._lore_data
+    
+    @property
+    def characters(self) -> List[str]:
+        """Character names in lore order, loading the file on first access."""
+        self._ensure_loaded()
+        return self._characters
+    
+    @property
+    def items(self) -> List[str]:
+        """Item names in lore order, loading the file on first access."""
+        self._ensure_loaded()
+        return self._items
+    
+    @property
+    def quests(self) -> List[str]:
+        """Quest titles in lore order, loading the file on first access."""
+        self._ensure_loaded()
+        return self._quests
+    
+    @property
+    def version(self) -> int:
+        """Load counter for invalidating derived caches, loading the file on first access."""
+        self._ensure_loaded()
+        return self._version
     
     def load_lore(self) -> None:
-        """Load lore from the specified file."""
+        """Load lore from the specified file.
+        
+        Runs automatically on first use; call it again to reload the file.
+        """
+        with self._load_lock:
+            try:
+                self._load_lore_file()
+            finally:
+                # A missing or broken file is reported once, not on every lookup
+                self._loaded = True
+    
+    def _load_lore_file(self) -> None:
+        """Read and parse the lore file (callers hold _load_lock)."""
         try:
             if not os.path.exists(self.lore_file):
                 logger.warning(f"Lore file not found: {self.lore_file}")
                 return
             
-            with open(self.lore_file, 'r', encoding='utf-8') as f:
-                raw_content = f.read()
-            
-            # Parse the lore content
-            self._parse_lore_content(raw_content)
+            stat = os.stat(self.lore_file)
+            cache_key = (LORE_CACHE_FORMAT, stat.st_mtime_ns, stat.st_size)
+            if not self._load_cached_lore(cache_key):
+                with open(self.lore_file, 'r', encoding='utf-8') as f:
+                    raw_content = f.read()
+                
+                # Parse the lore content
+                self._parse_lore_content(raw_content)
+                self._save_cached_lore(cache_key)
+            self._build_entry_index()
+            self._version += 1
             logger.info(f"Fangen lore loaded successfully from {self.lore_file}")
             
         except Exception as e:
             logger.error(f"Error loading lore: {e}", exc_info=True)
     
+    def _load_cached_lore(self, cache_key: Tuple[int, int, int]) -> bool:
+        """Restore the parsed lore cached by an earlier run, if it is still current.
+        
+        The cache is plain JSON, so a file planted in its place can at worst
+        supply wrong lore, never run code.
+        
+        Args:
+            cache_key: (LORE_CACHE_FORMAT, mtime in ns, size) of the lore file
+            
+        Returns:
+            True if the cache matched and was loaded, False if the file must be parsed
+        """
+        try:
+            with open(self.lore_file + '.cache.json', 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable lore cache: {e}")
+            return False
+        
+        # JSON has no tuples, so the stored key comes back as a list
+        if not isinstance(cached, dict) or cached.get("key") != list(cache_key):
+            return False
+        
+        self._lore_data = cached["lore_data"]
+        self._characters = cached["characters"]
+        self._items = cached["items"]
+        self._quests = cached["quests"]
+        logger.debug(f"Lore loaded from cache for {self.lore_file}")
+        return True
+    
+    def _save_cached_lore(self, cache_key: Tuple[int, int, int]) -> None:
+        """Save the parsed lore as JSON next to the lore file for the next start.
+        
+        The cache is written to a temporary file and renamed into place, so a
+        concurrent start never reads a partial file.
+        
+        Args:
+            cache_key: (LORE_CACHE_FORMAT, mtime in ns, size) of the parsed file
+        """
+        cache_path = self.lore_file + '.cache.json'
+        try:
+            with open(cache_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({
+                    "key": cache_key,
+                    "lore_data": self._lore_data,
+                    "characters": self._characters,
+                    "items": self._items,
+                    "quests": self._quests
+                }, f, ensure_ascii=False)
+            os.replace(cache_path + '.tmp', cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write lore cache {cache_path}: {e}")
+    
     def _parse_lore_content(self, content: str) -> None:
         """
         Parse the lore content into structured data.
         Handles hierarchical format with main categories and subcategories.
         """
-        # Process character profiles
-        self._parse_character_profiles(content)
+        self._sections = self._split_sections(content)
+        try:
+            # Process character profiles
+            self._parse_character_profiles(content)
+            
+            # Process world history and lore
+            self._parse_world_history(content)
+            
+            # Process items and quests
+            self._parse_items_and_quests(content)
+        finally:
+            # The sections copy the file's text; they're only needed while parsing
+            self._sections = {}
+    
+    @staticmethod
+    def _split_sections(content: str) -> Dict[str, str]:
+        """Split the lore text into top-level sections in one pass.
         
-        # Process world history and lore
-        self._parse_world_history(content)
+        Args:
+            content: Raw lore text content
+            
+        Returns:
+            Dictionary mapping each heading line (e.g. "Key Historical Events" or
+            "Quest: <title>") to the text from that heading up to the next one.
+            A heading that appears twice keeps its first section.
+        """
+        sections = {}
+        headings = list(_HEADING_RE.finditer(content))
+        ends = [heading.start() for heading in headings[1:]] + [len(content)]
+        for heading, end in zip(headings, ends):
+            sections.setdefault(heading.group(), content[heading.start():end])
+        return sections
+    
+    def _build_char_automaton(self):
+        """Build an automaton that finds every character name in one pass.
         
-        # Process items and quests
-        self._parse_items_and_quests(content)
+        Returns:
+            An ahocorasick.Automaton, or None if pyahocorasick isn't installed
+            or there are fewer than AUTOMATON_MIN_CHARACTERS characters
+        """
+        if ahocorasick is None or len(self._characters) < AUTOMATON_MIN_CHARACTERS:
+            return None
+        automaton = ahocorasick.Automaton()
+        for character in self._characters:
+            automaton.add_word(character, character)
+        automaton.make_automaton()
+        return automaton
+    
+    def _build_lower_index(self) -> Dict[str, List[Tuple[str, str]]]:
+        """Lowercase every entry's searchable text once for search_lore.
+        
+        String entries are searched by content; dict entries by their string
+        fields and their name. Fields are joined with NUL so a query can't
+        match across two of them.
+        
+        Returns:
+            Dictionary mapping each category to (entry name, lowercased text) pairs
+        """
+        index = {}
+        for category, entries in self._lore_data.items():
+            searchable = []
+            for name, content in entries.items():
+                if isinstance(content, str):
+                    searchable.append((name, content.lower()))
+                elif isinstance(content, dict):
+                    fields = [value for value in content.values() if isinstance(value, str)]
+                    fields.append(name)
+                    searchable.append((name, "\0".join(fields).lower()))
+            index[category] = searchable
+        return index
+    
+    def _build_entry_index(self) -> None:
+        """Map each entry name to its category and content and drop stale entry bundles.
+        
+        A name used in several categories resolves to the first, as before.
+        """
+        entry_index = {}
+        for category, entries in self._lore_data.items():
+            for entry_name, content in entries.items():
+                entry_index.setdefault(entry_name, (category, content))
+        self._entry_index = entry_index
+        self._lower_index = self._build_lower_index()
+        character_traits = {}
+        for name, info in self._lore_data["characters"].items():
+            personality = info.get("personality", "")
+            if isinstance(personality, str):
+                character_traits[name] = frozenset(_WORD_RE.findall(personality.lower()))
+        self._character_traits = character_traits
+        self._char_automaton = self._build_char_automaton()
+        self._entry_bundles = {}
+        self._formatted_entries = {}
+        self._search_cache.clear()
     
     def _parse_character_profiles(self, content: str) -> None:
         """Parse character profiles from the content.
@@ -79,25 +414,16 @@ class FangenLoreManager:
         """
         # Look for character profile sections with more flexible pattern matching
         # This improved pattern handles both uppercase and mixed case character names
-        # and accounts for variations in formatting
-        character_pattern = r'([A-Z][A-Za-z, ]+)\n•\s*Backstory\s*&?\s*Role:\s*(.*?)•\s*Personality\s*&?\s*Motivations:\s*(.*?)(?:•\s*Item\s*&?\s*Quest Connections:|•\s*Relationships:)'
-        character_sections = re.findall(character_pattern, content, re.DOTALL)
+        # and accounts for variations in formatting. Each pattern below requires a
+        # literal heading, so a plain substring test skips the scan when it's absent.
+        character_sections = _CHAR_RE.finditer(content) if "Backstory" in content else ()
         
-        for name, backstory, personality in character_sections:
-            name = name.strip()
-            backstory = backstory.strip()
-            personality = personality.strip()
+        for section in character_sections:
+            name, backstory, personality = section.groups()
             
-            # Extract item and quest connections if available
-            # Improved pattern with more flexible matching for section headers
-            item_quest_pattern = r'•\s*Item\s*&?\s*Quest Connections:(.*?)(?:_{10,}|$)'
-            # Use a safer approach to find content after the character name
-            name_pos = content.find(name)
-            if name_pos >= 0:
-                search_content = content[name_pos:]
-                item_quest_match = re.search(item_quest_pattern, search_content, re.DOTALL)
-            else:
-                item_quest_match = None
+            # Extract item and quest connections if available, searching from
+            # where this profile's personality text ends
+            item_quest_match = _ITEM_QUEST_RE.search(content, section.end(3))
             
             item_connections = ""
             quest_connections = ""
@@ -105,43 +431,40 @@ class FangenLoreManager:
                 item_quest_text = item_quest_match.group(1).strip()
                 
                 # Further parse items and quests
-                item_pattern = r'•\s*Potential Items:(.*?)(?:•\s*Quests:|$)'
-                item_match = re.search(item_pattern, item_quest_text, re.DOTALL)
+                item_match = _POTENTIAL_ITEMS_RE.search(item_quest_text)
                 if item_match:
                     item_connections = item_match.group(1).strip()
                 
-                quest_pattern = r'•\s*Quests:(.*?)(?:$)'
-                quest_match = re.search(quest_pattern, item_quest_text, re.DOTALL)
+                quest_match = _CHAR_QUESTS_RE.search(item_quest_text)
                 if quest_match:
                     quest_connections = quest_match.group(1).strip()
             
             # Create character profile
-            self.lore_data["characters"][name] = {
+            self._lore_data["characters"][name] = {
                 "backstory": backstory,
                 "personality": personality,
                 "item_connections": item_connections,
                 "quest_connections": quest_connections
             }
             
-            self.characters.append(name)
+            self._characters.append(name)
         
         # Also look for more comprehensive character profiles
-        expanded_char_pattern = r'([A-Za-z, ]+)\n•\s*Role:\s*(.*?)•\s*Backstory:\s*(.*?)•\s*Personality:\s*(.*?)•\s*Relationships:\s*(.*?)•\s*Significance in Lore:\s*(.*?)(?:_{10,}|$)'
-        expanded_char_sections = re.findall(expanded_char_pattern, content, re.DOTALL)
+        expanded_char_sections = _EXPANDED_CHAR_RE.findall(content) if "Significance in Lore:" in content else []
         
         for name, role, backstory, personality, relationships, significance in expanded_char_sections:
             name = name.strip()
             
             # If character already exists from first pass, enhance it
-            if name in self.lore_data["characters"]:
-                self.lore_data["characters"][name].update({
+            if name in self._lore_data["characters"]:
+                self._lore_data["characters"][name].update({
                     "role": role.strip(),
                     "relationships": relationships.strip(),
                     "significance": significance.strip()
                 })
             else:
                 # Create new character entry
-                self.lore_data["characters"][name] = {
+                self._lore_data["characters"][name] = {
                     "role": role.strip(),
                     "backstory": backstory.strip(),
                     "personality": personality.strip(),
@@ -149,113 +472,111 @@ class FangenLoreManager:
                     "significance": significance.strip()
                 }
                 
-                if name not in self.characters:
-                    self.characters.append(name)
+                if name not in self._characters:
+                    self._characters.append(name)
+    
+    def _add_bullets(self, category: str, text: str) -> None:
+        """Add each "• Name: description" bullet in text to a lore category."""
+        entries = self._lore_data[category]
+        for bullet in _BULLET_KV_RE.finditer(text):
+            entries[bullet.group(1)] = bullet.group(2)
     
     def _parse_world_history(self, content: str) -> None:
-        """Parse world history and lore from the content."""
+        """Parse world history and lore from the content.
+        
+        Each pattern only runs over its own section from _split_sections;
+        sections missing from the file are skipped without a scan.
+        """
+        sections = self._sections
+        
         # Look for world overview
-        world_pattern = r'The World of Fangen\n•\s*Overview:\s*(.*?)(?:Key Historical Events|\n\n)'
-        world_match = re.search(world_pattern, content, re.DOTALL)
+        world_section = sections.get("The World of Fangen")
+        world_match = _WORLD_RE.search(world_section) if world_section else None
         if world_match:
-            self.lore_data["world"]["Overview"] = world_match.group(1).strip()
+            self._lore_data["world"]["Overview"] = world_match.group(1).strip()
         
         # Parse historical events
-        events_pattern = r'Key Historical Events\n(•\s*[^•]+)'
-        events_match = re.search(events_pattern, content, re.DOTALL)
+        events_section = sections.get("Key Historical Events")
+        events_match = _EVENTS_RE.search(events_section) if events_section else None
         if events_match:
             events_text = events_match.group(1)
-            event_items = re.findall(r'•\s*([^:]+):\s*([^•]+)', events_text, re.DOTALL)
-            
-            for event_name, event_desc in event_items:
-                self.lore_data["events"][event_name.strip()] = event_desc.strip()
+            self._add_bullets("events", events_text)
         
         # Parse elemental and mystical themes
-        themes_pattern = r'Elemental and Mystical Themes\n(•\s*[^•]+)'
-        themes_match = re.search(themes_pattern, content, re.DOTALL)
+        themes_section = sections.get("Elemental and Mystical Themes")
+        themes_match = _THEMES_RE.search(themes_section) if themes_section else None
         if themes_match:
             themes_text = themes_match.group(1)
-            theme_items = re.findall(r'•\s*([^:]+):\s*([^•]+)', themes_text, re.DOTALL)
-            
-            for theme_name, theme_desc in theme_items:
-                self.lore_data["themes"][theme_name.strip()] = theme_desc.strip()
+            self._add_bullets("themes", themes_text)
         
         # Parse cultural and social dynamics
-        culture_pattern = r'Cultural and Social Dynamics\n(•\s*[^•]+)'
-        culture_match = re.search(culture_pattern, content, re.DOTALL)
+        culture_section = sections.get("Cultural and Social Dynamics")
+        culture_match = _CULTURE_RE.search(culture_section) if culture_section else None
         if culture_match:
             culture_text = culture_match.group(1)
-            culture_items = re.findall(r'•\s*([^:]+):\s*([^•]+)', culture_text, re.DOTALL)
-            
-            for faction_name, faction_desc in culture_items:
-                self.lore_data["factions"][faction_name.strip()] = faction_desc.strip()
+            self._add_bullets("factions", culture_text)
     
     def _parse_items_and_quests(self, content: str) -> None:
         """Parse items and quests from the content."""
         # Look for item crafting sections
-        item_pattern = r'Item Crafting & Evolution:\s*(.*?)(?:\d\.\s*Quest Narratives:|$)'
-        item_match = re.search(item_pattern, content, re.DOTALL)
+        item_match = _ITEM_SECTION_RE.search(content) if "Item Crafting & Evolution:" in content else None
         if item_match:
             item_text = item_match.group(1)
             
             # Parse item tiers
-            tier_pattern = r'•\s*([^:]+):\s*([^•]+)'
-            tier_items = re.findall(tier_pattern, item_text, re.DOTALL)
-            
-            for tier_name, tier_desc in tier_items:
-                self.lore_data["items"][tier_name.strip()] = tier_desc.strip()
+            self._add_bullets("items", item_text)
             
             # Extract specific item examples from the text
-            item_examples = re.findall(r'((?:Ape\'s Wrath|Wagami\'s Catalyst|Shokei\'s Maw|Moon Blade|Seigo\'s Rampart|Miyou\'s Insight Amulet|Kagitada\'s Lock|Paper\'s Edge|Paper Reaver|Alpha Empress\'s Sigil|Voidforged Relic|Inferno Fang|Emberdust Vial|Solar Fang)[^,.]*)', content)
-            
-            for item in item_examples:
-                if item.strip() not in self.items:
-                    self.items.append(item.strip())
+            for item_match in _ITEM_EXAMPLES_RE.finditer(content):
+                item = item_match.group(1)
+                if item.strip() not in self._items:
+                    self._items.append(item.strip())
                     
-                    # Try to determine rarity
+                    # Try to determine rarity from the text around the item's first
+                    # mention, which can sit inside an earlier entry, so it is searched
+                    # for (once, and never past this match) rather than taken from here
+                    pos = content.find(item, 0, item_match.end())
+                    window = content[pos - 100:pos + 100]
                     rarity = "Normal"
-                    if "Legendary" in content[content.find(item)-100:content.find(item)+100]:
+                    if "Legendary" in window:
                         rarity = "Legendary"
-                    elif "Rare" in content[content.find(item)-100:content.find(item)+100]:
+                    elif "Rare" in window:
                         rarity = "Rare"
                     
-                    self.lore_data["items"][item.strip()] = {
+                    self._lore_data["items"][item.strip()] = {
                         "name": item.strip(),
                         "rarity": rarity,
                         "description": "An item from the world of Fangen."
                     }
         
         # Look for quest narrative sections
-        quest_pattern = r'Quest Narratives:\s*(.*?)(?:\d\.\s*|$)'
-        quest_match = re.search(quest_pattern, content, re.DOTALL)
+        quest_match = _QUEST_SECTION_RE.search(content) if "Quest Narratives:" in content else None
         if quest_match:
             quest_text = quest_match.group(1)
             
             # Parse quest themes
-            theme_pattern = r'•\s*([^:]+):\s*([^•]+)'
-            theme_items = re.findall(theme_pattern, quest_text, re.DOTALL)
-            
-            for theme_name, theme_desc in theme_items:
-                self.lore_data["quests"][theme_name.strip()] = theme_desc.strip()
+            self._add_bullets("quests", quest_text)
         
         # Look for specific quest examples
-        quest_titles = re.findall(r'Quest: ([^\n]+)', content)
+        quest_titles = _QUEST_TITLE_RE.findall(content) if "Quest: " in content else []
+        # Choices are matched across the whole file, so every scene shares one scan
+        choice_matches = _CHOICE_RE.findall(content) if quest_titles else []
         for title in quest_titles:
-            if title.strip() not in self.quests:
-                self.quests.append(title.strip())
+            if title.strip() not in self._quests:
+                self._quests.append(title.strip())
                 
-                # Try to find quest description
-                quest_desc_pattern = f'Quest: {re.escape(title)}(.*?)(?:Scene \d+:|$)'
-                quest_desc_match = re.search(quest_desc_pattern, content, re.DOTALL)
+                # Try to find quest description in the quest's own section
+                quest_section = self._sections.get(f"Quest: {title}", content)
+                quest_desc_match = _quest_desc_re(title).search(quest_section)
                 
                 if quest_desc_match:
-                    self.lore_data["quests"][title.strip()] = {
+                    self._lore_data["quests"][title.strip()] = {
                         "title": title.strip(),
                         "description": quest_desc_match.group(1).strip(),
-                        "scenes": self._parse_quest_scenes(content, title)
+                        "scenes": self._parse_quest_scenes(content, title, choice_matches)
                     }
     
-    def _parse_quest_scenes(self, content: str, quest_title: str) -> List[Dict]:
+    def _parse_quest_scenes(self, content: str, quest_title: str, choice_matches: List[Tuple[str, str, str, str]]) -> List[Dict]:
         """Parse quest scenes for a specific quest.
         
         Extracts scene information including settings, dialogues, and player choices
@@ -264,6 +585,7 @@ class FangenLoreManager:
         Args:
             content: Raw lore text content to parse
             quest_title: Title of the quest to parse scenes for
+            choice_matches: _CHOICE_RE.findall result for the content
             
         Returns:
             List of dictionaries containing scene data
@@ -272,33 +594,26 @@ class FangenLoreManager:
         
         # Find all scenes in this quest with improved pattern matching
         # This pattern is more robust to variations in formatting and handles scene transitions better
-        scene_pattern = f'Quest:\\s*{re.escape(quest_title)}.*?Scene\\s*(\\d+):\\s*([^\n]+)(.*?)(?:Scene\\s*\\d+:|Your\\s*Choice:|Epilogue:|$)'
-        scene_matches = re.findall(scene_pattern, content, re.DOTALL)
+        scene_matches = _scene_re(quest_title).findall(self._sections.get(f"Quest: {quest_title}", content))
         
         for scene_num, scene_title, scene_content in scene_matches:
             # Parse scene setting with improved pattern
-            setting_pattern = r'Setting:\s*(.*?)(?:[A-Z][a-z]+\s*:|$)'
-            setting_match = re.search(setting_pattern, scene_content, re.DOTALL)
+            setting_match = _SCENE_SETTING_RE.search(scene_content)
             setting = setting_match.group(1).strip() if setting_match else ""
             
             # Parse NPC dialogues with improved pattern
             npc_dialogues = {}
-            npc_pattern = r'([A-Za-z, ]+)(?:\(.*?\))?:\s*"([^"]+)"'
-            npc_matches = re.findall(npc_pattern, scene_content, re.DOTALL)
+            npc_matches = _NPC_RE.findall(scene_content)
             
             for npc, dialogue in npc_matches:
                 npc_dialogues[npc.strip()] = dialogue.strip()
             
             # Parse player choices with improved pattern
             choices = []
-            choice_pattern = r'•\s*Option\s*(\d+[A-Z]?):\s*([^\n]+)(?:\nPlayer:\s*"([^"]+)")?\s*Outcome:(.*?)(?:•\s*Option\s*\d+[A-Z]?:|$)'
-            choice_matches = re.findall(choice_pattern, content, re.DOTALL)
-            
             for choice_id, choice_desc, player_dialogue, outcome in choice_matches:
                 # Parse inventory updates
                 inv_updates = []
-                inv_pattern = r'\[INV_UPDATE: ([^\]]+)\]'
-                inv_matches = re.findall(inv_pattern, outcome, re.DOTALL)
+                inv_matches = _INV_RE.findall(outcome)
                 
                 for inv_update in inv_matches:
                     inv_updates.append(inv_update.strip())
@@ -323,72 +638,108 @@ class FangenLoreManager:
     
     def get_categories(self) -> List[str]:
         """Get all available lore categories."""
+        self._ensure_loaded()
         # Return only categories that have content
-        return [category for category, entries in self.lore_data.items() if entries]
+        return [category for category, entries in self._lore_data.items() if entries]
     
     def get_characters(self) -> List[str]:
         """Get all available characters."""
-        return sorted(self.characters)
+        self._ensure_loaded()
+        return sorted(self._characters)
     
     def get_items(self) -> List[str]:
         """Get all available items."""
-        return sorted(self.items)
+        self._ensure_loaded()
+        return sorted(self._items)
     
     def get_quests(self) -> List[str]:
         """Get all available quests."""
-        return sorted(self.quests)
+        self._ensure_loaded()
+        return sorted(self._quests)
     
     def get_entries_by_category(self, category: str) -> List[str]:
         """Get all entries for a specific category."""
-        if category.lower() in self.lore_data:
-            return sorted(list(self.lore_data[category.lower()].keys()))
+        self._ensure_loaded()
+        if category.lower() in self._lore_data:
+            return sorted(list(self._lore_data[category.lower()].keys()))
         return []
     
     def get_entry_content(self, entry_name: str) -> Optional[Dict]:
         """Get the content of a specific lore entry."""
-        for category, entries in self.lore_data.items():
-            if entry_name in entries:
-                return entries[entry_name]
-        return None
+        self._ensure_loaded()
+        hit = self._entry_index.get(entry_name)
+        return hit[1] if hit else None
+    
+    def get_formatted_entry(self, entry_name: str) -> Optional[str]:
+        """Get an entry's content as Telegram HTML, formatted once per lore load.
+        
+        Dict entries become one "<b>Field</b>: value" paragraph per field,
+        leaving out name and rarity; string entries are escaped as they are.
+        
+        Args:
+            entry_name: Name of the lore entry
+            
+        Returns:
+            The formatted text, or None if the entry does not exist
+        """
+        text = self._formatted_entries.get(entry_name)
+        if text is None:
+            content = self.get_entry_content(entry_name)
+            if content is None:
+                return None
+            if isinstance(content, dict):
+                text = "".join(
+                    f"<b>{html.escape(key.capitalize())}</b>: {html.escape(str(value))}\n\n"
+                    for key, value in content.items()
+                    if key not in ("name", "rarity")
+                )
+            else:
+                text = html.escape(content)
+            self._formatted_entries[entry_name] = text
+        return text
     
     def get_character_info(self, character_name: str) -> Optional[Dict]:
         """Get information about a specific character."""
-        if character_name in self.lore_data["characters"]:
-            return self.lore_data["characters"][character_name]
-        return None
+        self._ensure_loaded()
+        return self._lore_data["characters"].get(character_name)
     
     def get_item_info(self, item_name: str) -> Optional[Dict]:
         """Get information about a specific item."""
-        if item_name in self.lore_data["items"]:
-            return self.lore_data["items"][item_name]
-        return None
+        self._ensure_loaded()
+        return self._lore_data["items"].get(item_name)
     
     def get_quest_info(self, quest_name: str) -> Optional[Dict]:
         """Get information about a specific quest."""
-        if quest_name in self.lore_data["quests"]:
-            return self.lore_data["quests"][quest_name]
-        return None
+        self._ensure_loaded()
+        return self._lore_data["quests"].get(quest_name)
     
     def search_lore(self, query: str) -> Dict[str, List[str]]:
-        """Search the lore for entries matching the query."""
-        results = {}
+        """Search the lore for entries matching the query.
         
-        for category, entries in self.lore_data.items():
-            category_results = []
-            for name, content in entries.items():
-                # For string content
-                if isinstance(content, str) and query.lower() in content.lower():
-                    category_results.append(name)
-                # For dictionary content
-                elif isinstance(content, dict):
-                    found = False
-                    for key, value in content.items():
-                        if isinstance(value, str) and query.lower() in value.lower():
-                            found = True
-                            break
-                    if found or query.lower() in name.lower():
-                        category_results.append(name)
+        Matching ignores case and surrounding whitespace. Recent results are
+        cached by normalized query until the lore is reloaded, so the returned
+        dict is shared and must not be modified.
+        
+        Args:
+            query: The search term
             
+        Returns:
+            Dictionary mapping categories to matching entry names
+        """
+        self._ensure_loaded()
+        key = query.strip().lower()
+        results = self._search_cache.get(key)
+        if results is None:
+            results = self._search_lore_impl(key)
+            self._search_cache.set(key, results)
+        return results
+    
+    def _search_lore_impl(self, query: str) -> Dict[str, List[str]]:
+        """Scan the lowercased index for the (already lowercased) query."""
+        results = {}
+        
+        for category, searchable in self._lower_index.items():
+            category_results = [name for name, text in searchable if query in text]
             if category_results:
                 results[category] = category_results
         
@@ -396,46 +747,66 @@ class FangenLoreManager:
     
     def get_character_dialogue(self, character_name: str, context: str) -> str:
         """Generate a contextual dialogue for a character based on their personality."""
-        if character_name not in self.lore_data["characters"]:
+        self._ensure_loaded()
+        if character_name not in self._lore_data["characters"]:
             return f"I am {character_name}. What do you want to know?"
         
-        character = self.lore_data["characters"][character_name]
-        
-        # Extract personality traits
-        personality = character.get("personality", "")
-        if isinstance(personality, str):
-            traits = re.findall(r'([a-z]+)', personality.lower())
-        else:
-            traits = []
+        # Personality words, tokenized once per lore load
+        traits = self._character_traits.get(character_name, frozenset())
         
         # Generate dialogue based on traits and context
-        if "playful" in traits or "quirky" in traits or "eccentric" in traits:
+        if traits & _PLAYFUL_TRAITS:
             return f"*with a mischievous grin* Ah, curious about {context}, are you? Well, let me tell you something interesting..."
-        elif "stoic" in traits or "cold" in traits or "methodical" in traits:
+        elif traits & _STOIC_TRAITS:
             return f"*stares intently* {context}? I will speak of it, though few deserve such knowledge."
-        elif "arrogant" in traits or "cunning" in traits:
+        elif traits & _ARROGANT_TRAITS:
             return f"*smirks confidently* You wish to know of {context}? Most wouldn't even comprehend it, but perhaps you might..."
-        elif "fierce" in traits or "protective" in traits or "loyal" in traits:
+        elif traits & _FIERCE_TRAITS:
             return f"*stands tall* {context} is a matter of honor and duty. Listen carefully to what I tell you."
         else:
             return f"You ask about {context}? Very well, I shall share what I know."
     
+    def get_entry_bundle(self, entry_name: str) -> Tuple[Optional[str], Any, List[str]]:
+        """Get an entry's category, content and related characters in one lookup.
+        
+        Args:
+            entry_name: Name of the lore entry
+            
+        Returns:
+            Tuple of (category, content, related characters); category and
+            content are None if the entry does not exist. The related list is
+            shared between calls and must not be modified.
+        """
+        self._ensure_loaded()
+        bundle = self._entry_bundles.get(entry_name)
+        if bundle is None:
+            hit = self._entry_index.get(entry_name)
+            if hit is None:
+                return None, None, []
+            category, content = hit
+            bundle = (category, content, self._find_related_characters(content))
+            self._entry_bundles[entry_name] = bundle
+        return bundle
+    
     def get_related_characters(self, entry_name: str) -> List[str]:
         """Find characters related to a specific lore entry."""
+        return self._find_related_characters(self.get_entry_content(entry_name))
+    
+    def _find_related_characters(self, entry_content: Any) -> List[str]:
+        """Find characters mentioned in an entry's content."""
         related = []
-        entry_content = self.get_entry_content(entry_name)
-        
         if not entry_content:
             return related
             
-        entry_str = ""
-        if isinstance(entry_content, str):
-            entry_str = entry_content
-        elif isinstance(entry_content, dict):
-            entry_str = json.dumps(entry_content)
+        entry_str = _entry_text(entry_content)
         
         # Check which characters are mentioned in the entry
-        for character in self.characters:
+        if self._char_automaton is not None:
+            # One pass over the entry finds every name, overlapping ones included
+            mentioned = {character for _, character in self._char_automaton.iter(entry_str)}
+            return [character for character in self._characters if character in mentioned]
+        
+        for character in self._characters:
             if character in entry_str:
                 related.append(character)
                 
@@ -6,19 +6,77 @@ Logger utility for ChuzoBot
 Enhanced with better formatting and rotation settings
 """
 
+import atexit
 import logging
 import os
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import datetime
 
 from config import LOG_LEVEL
 
+# Shared by the console and file handlers; formatting happens on the listener thread
+_FORMATTER = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# One queue handler per log file, shared by every logger writing to it. Its
+# listener thread does the console and file I/O, and is kept here so it stays alive.
+_queue_handlers = {}
+_listeners = []
+
+def _stop_listeners():
+    """Flush queued records and stop the listener threads at interpreter exit."""
+    for listener in _listeners:
+        listener.stop()
+
+atexit.register(_stop_listeners)
+
+def _get_queue_handler(log_file):
+    """Return the queue handler for log_file, starting its listener on first use.
+    
+    Args:
+        log_file: Name of the log file inside the logs directory
+        
+    Returns:
+        QueueHandler that enqueues records for the background listener
+    """
+    if log_file in _queue_handlers:
+        return _queue_handlers[log_file]
+    
+    # Create logs directory if it doesn't exist
+    os.makedirs('logs', exist_ok=True)
+    
+    # Create console handler
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(logging.INFO)  # Less verbose on console
+    console_handler.setFormatter(_FORMATTER)
+    
+    # Create file handler with improved rotation settings
+    file_handler = RotatingFileHandler(
+        os.path.join('logs', log_file),
+        maxBytes=10*1024*1024,  # 10MB
+        backupCount=10          # Keep more backups
+    )
+    file_handler.setLevel(logging.DEBUG)    # Full detail in log file
+    file_handler.setFormatter(_FORMATTER)
+    
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    
+    _queue_handlers[log_file] = QueueHandler(log_queue)
+    return _queue_handlers[log_file]
+
 def setup_logger(name, level=LOG_LEVEL, log_file='chuzobot.log'):
     """Set up and return a logger with the specified name and level.
     
-    Creates a logger with both console and file handlers,
-    with proper formatting and rotation settings.
+    Creates a logger that enqueues its records for a background listener,
+    which writes them to the console and a rotating log file, so logging
+    calls never block on disk I/O.
     
     Args:
         name: Name of the logger, typically __name__
@@ -28,9 +86,6 @@ def setup_logger(name, level=LOG_LEVEL, log_file='chuzobot.log'):
     Returns:
         Configured logger instance
     """
-    # Create logs directory if it doesn't exist
-    os.makedirs('logs', exist_ok=True)
-    
     # Convert string level to logging level
     if isinstance(level, str):
         level = getattr(logging, level.upper(), logging.INFO)
@@ -44,29 +99,8 @@ def setup_logger(name, level=LOG_LEVEL, log_file='chuzobot.log'):
         
     logger.setLevel(level)
     
-    # Create formatter with more detailed format
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    # Create console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)  # Less verbose on console
-    console_handler.setFormatter(formatter)
-    
-    # Create file handler with improved rotation settings
-    file_handler = RotatingFileHandler(
-        os.path.join('logs', log_file),
-        maxBytes=10*1024*1024,  # 10MB
-        backupCount=10          # Keep more backups
-    )
-    file_handler.setLevel(logging.DEBUG)    # Full detail in log file
-    file_handler.setFormatter(formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    # Add the shared queue handler to logger
+    logger.addHandler(_get_queue_handler(log_file))
     
     # Log logger creation
     logger.debug(f"Logger {name} initialized at {datetime.now().isoformat()}")
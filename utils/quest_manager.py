@@ -6,13 +6,16 @@ Quest Manager for ChuzoBot
 Handles quest progression, dialogue choices, and inventory integration
 """
 
+import html
 import json
 import random
 from typing import Dict, List, Optional, Any, Tuple
 
+from utils.cache import LRUCache
 from utils.logger import get_logger
 from utils.database import Database
 from utils.fangen_lore_manager import FangenLoreManager
+from config import INVENTORY_CACHE_SIZE
 
 logger = get_logger(__name__)
 
@@ -24,6 +27,9 @@ class QuestManager:
         self.db = db
         self.lore_manager = lore_manager
         self.active_quests = {}  # user_id -> active_quest_info
+        # user_id -> {item name: item}, dropped whenever that user's inventory changes
+        self._inventory_maps = LRUCache(maxsize=INVENTORY_CACHE_SIZE)
+        self._inventory_generation: Dict[int, int] = {}
     
     def get_available_quests(self, user_id: int) -> List[Dict]:
         """Get available quests for a user."""
@@ -192,6 +198,9 @@ class QuestManager:
                     
                     quest_state["inventory_updates"].append(f"Consumed {item_name}")
         
+        if choice["inventory_updates"]:
+            self.invalidate_inventory(user_id)
+        
         # Determine next scene
         next_scene_num = current_scene_num + 1
         next_scene = next((s for s in scenes if s["number"] == str(next_scene_num)), None)
@@ -298,15 +307,15 @@ class QuestManager:
         Returns:
             Dictionary with formatted scene content for display
         """
-        # Build narrative text
-        narrative = f"**Scene {scene['number']}: {scene['title']}**\n\n"
+        # Build narrative text (Telegram HTML; lore text is escaped)
+        narrative = f"<b>Scene {scene['number']}: {html.escape(scene['title'])}</b>\n\n"
         
         if scene['setting']:
-            narrative += f"*{scene['setting']}\n\n"
+            narrative += f"<i>{html.escape(scene['setting'])}</i>\n\n"
         
         # Add NPC dialogues
         for npc, dialogue in scene.get('npc_dialogues', {}).items():
-            narrative += f"**{npc}**: \"{dialogue}\"\n\n"
+            narrative += f"<b>{html.escape(npc)}</b>: \"{html.escape(dialogue)}\"\n\n"
         
         # Format choices
         choices = []
@@ -323,10 +332,13 @@ class QuestManager:
         }
     
     def get_character_response(self, user_id: int, character_name: str, message: str) -> str:
-        """Generate a response from a character based on the user's message."""
+        """Generate a response from a character based on the user's message.
+        
+        The response is Telegram HTML; the user's message and lore text are escaped.
+        """
         character_info = self.lore_manager.get_character_info(character_name)
         if not character_info:
-            return f"I am {character_name}, but I don't seem to have much to say right now."
+            return f"I am {html.escape(character_name)}, but I don't seem to have much to say right now."
         
         # Log interaction in database
         self.db.execute_query(
@@ -366,7 +378,7 @@ class QuestManager:
         if relevant_info:
             # Create character-specific response incorporating relevant info
             intro_phrases = self._get_character_intros(character_name, character_info)
-            return f"{random.choice(intro_phrases)} {random.choice(relevant_info)}."
+            return f"{random.choice(intro_phrases)} {html.escape(random.choice(relevant_info))}."
         else:
             # Generate generic response based on character traits
             return self._generate_generic_response(character_name, character_info, message)
@@ -424,6 +436,7 @@ class QuestManager:
         """Generate a generic response based on character traits."""
         personality = character_info.get("personality", "").lower()
         role = character_info.get("role", "").lower()
+        message = html.escape(message)
         
         # Character-specific generic responses
         if character_name == "Hand of Diamond":
@@ -433,10 +446,10 @@ class QuestManager:
             return f"My visions show many possible futures. The path you seek regarding '{message}' is but one of many, yet it could be crucial to preventing catastrophe."
         
         elif character_name == "Wagami":
-            return f"*adjusts glasses excitedly* Oh! That's an interesting query about '{message}'! It reminds me of an experiment I was conducting just last week with the wormhole dynamics!"
+            return f"<i>adjusts glasses excitedly</i> Oh! That's an interesting query about '{message}'! It reminds me of an experiment I was conducting just last week with the wormhole dynamics!"
         
         elif character_name == "Anko":
-            return f"*flips kunai knife casually* You want to know about '{message}'? Well, I could tell you... but then I'd have to... you know the rest. *smirks*"
+            return f"<i>flips kunai knife casually</i> You want to know about '{message}'? Well, I could tell you... but then I'd have to... you know the rest. <i>smirks</i>"
         
         # Generic responses based on personality types
         elif "arrogant" in personality or "cunning" in personality:
@@ -446,7 +459,7 @@ class QuestManager:
             return f"I have witnessed much regarding '{message}'. Whether you are ready for such knowledge remains to be seen."
         
         elif "playful" in personality or "eccentric" in personality:
-            return f"*eyes light up* '{message}'? Now that's a topic full of surprises! Just when you think you understand it, everything turns upside down!"
+            return f"<i>eyes light up</i> '{message}'? Now that's a topic full of surprises! Just when you think you understand it, everything turns upside down!"
         
         elif "fierce" in personality or "protective" in personality:
             return f"I would guard the truth about '{message}' with my life. It is not knowledge to be taken lightly."
@@ -475,4 +488,30 @@ class QuestManager:
                 "description": description
             })
         
-        return inventory
\ No newline at end of file
+        return inventory
+    
+    def get_inventory_map(self, user_id: int) -> Dict[str, Dict]:
+        """Get the user's inventory keyed by item name.
+        
+        The map is cached per user until invalidate_inventory is called for
+        them, so it is shared and must not be modified.
+        
+        Args:
+            user_id: The user whose inventory to get
+            
+        Returns:
+            Dictionary mapping item name to the item dict from get_inventory
+        """
+        inventory_map = self._inventory_maps.get(user_id)
+        if inventory_map is None:
+            generation = self._inventory_generation.get(user_id, 0)
+            inventory_map = {item["name"]: item for item in self.get_inventory(user_id)}
+            # Don't cache a map read while the inventory was being changed
+            if self._inventory_generation.get(user_id, 0) == generation:
+                self._inventory_maps.set(user_id, inventory_map)
+        return inventory_map
+    
+    def invalidate_inventory(self, user_id: int) -> None:
+        """Drop the cached inventory map after the user's items change."""
+        self._inventory_generation[user_id] = self._inventory_generation.get(user_id, 0) + 1
+        self._inventory_maps.pop(user_id)
\ No newline at end of file